@@ -0,0 +1,352 @@
+# bench.py
+# --------
+"""
+Headless benchmark for the Pacman agents.
+
+Plays every combination of agent x layout x depth x ghost type with fixed
+seeds and reports, per combination, the search effort (nodes expanded,
+nodes/sec and, for MCTSAgent, simulations/sec), the move latency (mean and
+p95) and the playing strength (win rate and average score).  Results can
+be written as JSON or CSV so that two runs can be diffed to catch
+performance regressions.
+
+Nodes are counted as the successors that Pacman's agent generates while
+choosing a move (GameState.exploredCount, in 'count' tracking mode).  For
+the search agents the evaluation calls and effective branching factor
+reported by their SearchStats collector are included too.
+
+With --micro it instead measures raw successor generation: successors/sec
+and the memory retained per successor state, on each layout.
+
+To run the default matrix, type 'python bench.py' from the command line.
+"""
+from game import Agent
+from pacman import GameState, ClassicGameRules, loadAgent
+from multiAgents import MultiAgentSearchAgent, ExpectimaxAgent, MCTSAgent
+import pacman
+import layout
+import util
+import textDisplay
+import os
+import sys
+import time
+import random
+
+DEFAULT_AGENTS = 'ReflexAgent,MinimaxAgent,AlphaBetaAgent,ExpectimaxAgent,GreedyAgent'
+DEFAULT_GHOSTS = 'RandomGhost,DirectionalGhost'
+
+FIELDS = ['agent', 'layout', 'depth', 'ghost', 'games', 'moves', 'nodes',
+          'nodesPerSec', 'simsPerSec', 'evaluations', 'branchingFactor', 'meanMoveTime', 'p95MoveTime',
+          'winRate', 'averageScore']
+
+
+class MeasuredAgent(Agent):
+    """
+    Wraps a Pacman agent and records the wall-clock time and the number of
+    states generated for each move it makes.
+    """
+
+    def __init__(self, agent):
+        Agent.__init__(self, 0)  # Pacman is always agent index 0
+        self.agent = agent
+        self.moveTimes = []
+        self.moveNodes = []
+
+    def registerInitialState(self, state):
+        if 'registerInitialState' in dir(self.agent):
+            self.agent.registerInitialState(state)
+
+    def getAction(self, state):
+        GameState.getAndResetExploredCount()
+        start = time.perf_counter()
+        action = self.agent.getAction(state)
+        self.moveTimes.append(time.perf_counter() - start)
+        self.moveNodes.append(GameState.getAndResetExploredCount())
+        return action
+
+    def final(self, state):
+        if 'final' in dir(self.agent):
+            self.agent.final(state)
+
+    def getSearchStats(self):
+        if 'getSearchStats' in dir(self.agent):
+            return self.agent.getSearchStats()
+        return None
+
+
+class BenchmarkRules(ClassicGameRules):
+    """
+    ClassicGameRules that also stop a game after maxMoves agent moves, so an
+    agent that dithers forever cannot hang the benchmark.  Such games count
+    as losses.
+    """
+
+    def __init__(self, maxMoves):
+        ClassicGameRules.__init__(self)
+        self.maxMoves = maxMoves
+
+    def process(self, state, game):
+        ClassicGameRules.process(self, state, game)
+        if len(game.moveHistory) >= self.maxMoves:
+            game.gameOver = True
+
+
+def agentKeywords(agentType):
+    """
+    The names of the options agentType's constructor accepts, including
+    those it passes on to its base classes through **kwargs.
+    """
+    import inspect
+    names = set()
+    for cls in agentType.__mro__:
+        if '__init__' not in cls.__dict__:
+            continue
+        params = list(inspect.signature(cls.__dict__['__init__']).parameters.values())
+        names.update(p.name for p in params[1:] if p.kind in (p.POSITIONAL_OR_KEYWORD, p.KEYWORD_ONLY))
+        if not any(p.kind == p.VAR_KEYWORD for p in params):
+            break
+    return names
+
+
+def usesDepth(agentType):
+    """
+    True for the agents whose search depth is set by --depths (MCTSAgent
+    has no depth, so it is benchmarked once, like the reflex agents).
+    """
+    return issubclass(agentType, MultiAgentSearchAgent) and not issubclass(agentType, MCTSAgent)
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+def benchmark(agentName, layoutName, depth, ghostName, numGames, numGhosts, seed, agentOpts, maxMoves=3000):
+    """
+    Plays numGames headless games of one configuration and returns a row
+    (a dict keyed by FIELDS) of aggregate measurements.  Game i is always
+    seeded with (seed, i), so every configuration sees the same games.
+    """
+    agentType = loadAgent(agentName, True)
+    if issubclass(agentType, MultiAgentSearchAgent):
+        keywords = agentKeywords(agentType)
+        opts = dict((key, value) for key, value in agentOpts.items() if key in keywords)
+        opts['depth'] = depth
+        opts['stats'] = '1'
+        if issubclass(agentType, (ExpectimaxAgent, MCTSAgent)):
+            opts.setdefault('ghostModel', ghostName)
+        depth = int(depth) if usesDepth(agentType) else None
+    else:
+        opts = {}
+        depth = None
+    ghostType = loadAgent(ghostName, True)
+    board = layout.getLayout(layoutName)
+    if board == None:
+        raise Exception("The layout " + layoutName + " cannot be found")
+
+    GameState.setExploredMode('count')
+    rules = BenchmarkRules(maxMoves)
+    moveTimes, moveNodes, scores, wins = [], [], [], []
+    searchMoves = []
+    for i in range(numGames):
+        random.seed('%s-%d' % (seed, i))
+        agent = MeasuredAgent(agentType(**opts))
+        ghosts = [ghostType(g + 1) for g in range(numGhosts)]
+        game = rules.newGame(board, agent, ghosts, textDisplay.NullGraphics(), quiet=True)
+        util.mutePrint()
+        try:
+            game.run()
+        finally:
+            util.unmutePrint()
+        moveTimes += agent.moveTimes
+        moveNodes += agent.moveNodes
+        scores.append(game.state.getScore())
+        if game.searchStats[0] != None:
+            searchMoves += game.searchStats[0]['moves']
+        wins.append(game.state.isWin())
+
+    totalTime = sum(moveTimes)
+    nodes = sum(moveNodes)
+    simulations = sum(m.get('simulations', 0) for m in searchMoves)
+    return {
+        'agent': agentName,
+        'layout': layoutName,
+        'depth': depth,
+        'ghost': ghostName,
+        'games': numGames,
+        'moves': len(moveTimes),
+        'nodes': nodes,
+        'nodesPerSec': nodes / totalTime if totalTime > 0 else 0.0,
+        'simsPerSec': simulations / totalTime if totalTime > 0 else 0.0,
+        'evaluations': sum(m['evaluations'] for m in searchMoves),
+        'branchingFactor': sum(m['branchingFactor'] for m in searchMoves) / len(searchMoves) if searchMoves else 0.0,
+        'meanMoveTime': totalTime / len(moveTimes) if moveTimes else 0.0,
+        'p95MoveTime': percentile(moveTimes, 0.95),
+        'winRate': wins.count(True) / float(len(wins)),
+        'averageScore': sum(scores) / float(len(scores)),
+    }
+
+
+def microbenchmark(layoutName, numGhosts, seconds, seed):
+    """
+    Measures raw successor generation, without any agent: replays the
+    states of a seeded random game and calls generateSuccessor for every
+    legal action of every agent in them, for about seconds seconds, and
+    reports the fastest pass.  Also
+    measures the memory retained per successor state with tracemalloc.
+    Returns (successors per second, bytes per retained state).
+    """
+    import tracemalloc
+    board = layout.getLayout(layoutName)
+    if board == None:
+        raise Exception("The layout " + layoutName + " cannot be found")
+    random.seed(seed)
+    state = GameState()
+    state.initialize(board, numGhosts)
+    moves = []
+    while not (state.isWin() or state.isLose()) and len(moves) < 500:
+        for agentIndex in range(state.getNumAgents()):
+            if state.isWin() or state.isLose():
+                break
+            actions = state.getLegalActions(agentIndex)
+            moves.append((state, agentIndex, actions))
+            state = state.generateSuccessor(agentIndex, random.choice(actions))
+
+    # Best pass over the states, as timeit does: slower passes measure
+    # interference from the rest of the machine, not the code
+    rate = 0.0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        passStart = time.perf_counter()
+        count = 0
+        for state, agentIndex, actions in moves:
+            for action in actions:
+                state.generateSuccessor(agentIndex, action)
+            count += len(actions)
+        rate = max(rate, count / (time.perf_counter() - passStart))
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    retained = [state.generateSuccessor(agentIndex, action)
+                for state, agentIndex, actions in moves for action in actions]
+    perState = (tracemalloc.get_traced_memory()[0] - before) / float(len(retained))
+    tracemalloc.stop()
+    return rate, perState
+
+
+def allLayoutNames():
+    return sorted(f[:-4] for f in os.listdir('layouts') if f.endswith('.lay'))
+
+
+def printRow(row):
+    depth = row['depth'] if row['depth'] is not None else '-'
+    print('%-16s %-16s %5s %-17s %6d %10d %11.0f %9.0f %10d %6.2f %9.4f %9.4f %5.2f %9.1f' % (
+        row['agent'], row['layout'], depth, row['ghost'], row['moves'], row['nodes'],
+        row['nodesPerSec'], row['simsPerSec'], row['evaluations'], row['branchingFactor'], row['meanMoveTime'],
+        row['p95MoveTime'], row['winRate'], row['averageScore']))
+
+
+def writeJson(rows, fname):
+    import json
+    with open(fname, 'w') as f:
+        json.dump(rows, f, indent=2)
+
+
+def writeCsv(rows, fname):
+    import csv
+    with open(fname, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def readCommand(argv):
+    from optparse import OptionParser
+    usageStr = """
+    USAGE:      python bench.py <options>
+    EXAMPLES:   (1) python bench.py
+                    - runs the full default matrix over layouts/*.lay
+                (2) python bench.py --agents AlphaBetaAgent --layouts smallClassic,mediumClassic
+                            --depths 2,3 -a evalFn=better --json run.json
+                    - benchmarks AlphaBetaAgent at depths 2 and 3 and saves JSON
+                (3) python bench.py --micro --layouts mediumClassic
+                    - measures successor generation speed and state size
+    """
+    parser = OptionParser(usageStr)
+    parser.add_option('--agents', dest='agents', default=DEFAULT_AGENTS,
+                      help=pacman.default('Comma separated agent TYPEs to benchmark'))
+    parser.add_option('--layouts', dest='layouts', default=None,
+                      help='Comma separated layouts [Default: every layouts/*.lay]')
+    parser.add_option('--depths', dest='depths', default='2',
+                      help=pacman.default('Comma separated search depths (search agents only)'))
+    parser.add_option('--ghosts', dest='ghosts', default=DEFAULT_GHOSTS,
+                      help=pacman.default('Comma separated ghost agent TYPEs'))
+    parser.add_option('-k', '--numghosts', type='int', dest='numGhosts', default=4,
+                      help=pacman.default('The maximum number of ghosts to use'))
+    parser.add_option('-n', '--numGames', type='int', dest='numGames', default=1,
+                      help=pacman.default('Games to play per configuration'))
+    parser.add_option('--maxMoves', type='int', dest='maxMoves', default=3000,
+                      help=pacman.default('Agent moves after which an unfinished game is stopped (and lost)'))
+    parser.add_option('--seed', dest='seed', default='cs188',
+                      help=pacman.default('Base random seed; game i of every configuration uses (seed, i)'))
+    parser.add_option('-a', '--agentArgs', dest='agentArgs',
+                      help='Comma separated values sent to the search agents that take them. e.g. "evalFn=better,tt=1"')
+    parser.add_option('--json', dest='json', default=None,
+                      help='Write the results to this JSON file')
+    parser.add_option('--csv', dest='csv', default=None,
+                      help='Write the results to this CSV file')
+    parser.add_option('--micro', action='store_true', dest='micro', default=False,
+                      help='Only measure successor generation (successors/sec and bytes per state) on each layout')
+    parser.add_option('--seconds', type='float', dest='seconds', default=2.0,
+                      help=pacman.default('How long --micro runs on each layout'))
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    return options
+
+
+def runMicrobenchmarks(options):
+    layouts = options.layouts.split(',') if options.layouts else allLayoutNames()
+    print('%-16s %14s %12s' % ('layout', 'successors/sec', 'bytes/state'))
+    for layoutName in layouts:
+        rate, perState = microbenchmark(layoutName, options.numGhosts, options.seconds, options.seed)
+        print('%-16s %14.0f %12.0f' % (layoutName, rate, perState))
+
+
+def runBenchmarks(options):
+    layouts = options.layouts.split(',') if options.layouts else allLayoutNames()
+    agentOpts = pacman.parseAgentArgs(options.agentArgs)
+    depths = options.depths.split(',')
+    rows = []
+    print('%-16s %-16s %5s %-17s %6s %10s %11s %9s %10s %6s %9s %9s %5s %9s' % (
+        'agent', 'layout', 'depth', 'ghost', 'moves', 'nodes', 'nodes/sec', 'sims/sec', 'evals',
+        'ebf', 'mean(s)', 'p95(s)', 'win', 'score'))
+    try:
+        for agentName in options.agents.split(','):
+            agentDepths = depths
+            if not usesDepth(loadAgent(agentName, True)):
+                agentDepths = depths[:1]
+            for layoutName in layouts:
+                for depth in agentDepths:
+                    for ghostName in options.ghosts.split(','):
+                        row = benchmark(agentName, layoutName, depth, ghostName, options.numGames,
+                                        options.numGhosts, options.seed, agentOpts, options.maxMoves)
+                        printRow(row)
+                        rows.append(row)
+    finally:
+        # Rows measured before an error or Ctrl-C are still written
+        if options.json:
+            writeJson(rows, options.json)
+        if options.csv:
+            writeCsv(rows, options.csv)
+    return rows
+
+
+if __name__ == '__main__':
+    options = readCommand(sys.argv[1:])
+    if options.micro:
+        runMicrobenchmarks(options)
+    else:
+        runBenchmarks(options)
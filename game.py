@@ -80,6 +80,7 @@ class Configuration:
     The convention for positions, like a graph, is that (0,0) is the lower left corner, x increases
     horizontally and y increases vertically.  Therefore, north is the direction of increasing y, or (0,1).
     """
+    __slots__ = ('pos', 'direction')
 
     def __init__(self, pos, direction):
         self.pos = pos
@@ -128,6 +129,8 @@ class AgentState:
     """
     AgentStates hold the state of an agent (configuration, speed, scared, etc).
     """
+    __slots__ = ('start', 'configuration', 'isPacman', 'scaredTimer',
+                 'numCarrying', 'numReturned')
 
     def __init__(self, startConfiguration, isPacman):
         self.start = startConfiguration
@@ -153,7 +156,10 @@ class AgentState:
         return hash(hash(self.configuration) + 13 * hash(self.scaredTimer))
 
     def copy(self):
-        state = AgentState(self.start, self.isPacman)
+        # Skips __init__: every slot is assigned below
+        state = AgentState.__new__(AgentState)
+        state.start = self.start
+        state.isPacman = self.isPacman
         state.configuration = self.configuration
         state.scaredTimer = self.scaredTimer
         state.numCarrying = self.numCarrying
@@ -262,7 +268,7 @@ class Grid:
         return tuple(bits)
 
     def _cellIndexToPosition(self, index):
-        x = index / self.height
+        x = index // self.height
         y = index % self.height
         return x, y
 
@@ -293,12 +299,178 @@ class Grid:
         return bools
 
 
+class BitGrid:
+    """
+    A Grid whose cells are packed into a single arbitrary-precision int, with
+    cell (x,y) stored at bit x * height + y.  It supports the same grid[x][y],
+    asList() and count() interface as Grid, but copy() is O(1) (ints are
+    immutable, so copies share the bits until one of them is written) and
+    count() is a popcount.
+
+    Only boolean cells are supported.
+    """
+
+    def __init__(self, width, height, initialValue=False, bits=0):
+        if initialValue not in [False, True]:
+            raise Exception('Grids can only contain booleans')
+        self.CELLS_PER_INT = 30
+
+        self.width = width
+        self.height = height
+        if initialValue:
+            bits = (1 << (width * height)) - 1
+        self.bits = bits
+
+    def __getitem__(self, x):
+        if x < 0:
+            x += self.width
+        if x < 0 or x >= self.width:
+            raise IndexError('BitGrid column index out of range')
+        return _BitColumn(self, x)
+
+    def __setitem__(self, x, column):
+        for y in range(self.height):
+            self[x][y] = column[y]
+
+    def __iter__(self):
+        for x in range(self.width):
+            yield _BitColumn(self, x)
+
+    def __len__(self):
+        return self.width
+
+    def __str__(self):
+        out = [[str(self[x][y])[0] for x in range(self.width)]
+               for y in range(self.height)]
+        out.reverse()
+        return '\n'.join([''.join(x) for x in out])
+
+    def __eq__(self, other):
+        if other == None:
+            return False
+        if isinstance(other, BitGrid):
+            return self.bits == other.bits and self.height == other.height
+        return self.asList() == other.asList()
+
+    def __hash__(self):
+        return hash(self.bits)
+
+    def copy(self):
+        return BitGrid(self.width, self.height, bits=self.bits)
+
+    def deepCopy(self):
+        return self.copy()
+
+    def shallowCopy(self):
+        # Writes to a BitGrid rebind self.bits, so there is no aliasing to
+        # share; a shallow copy is the same as a copy.
+        return self.copy()
+
+    def count(self, item=True):
+        numTrue = _popcount(self.bits)
+        if item:
+            return numTrue
+        return self.width * self.height - numTrue
+
+    def asList(self, key=True):
+        if not key:
+            return [(x, y) for x in range(self.width)
+                    for y in range(self.height) if not self[x][y]]
+        list = []
+        bits = self.bits
+        height = self.height
+        while bits:
+            lowest = bits & -bits
+            list.append(divmod(lowest.bit_length() - 1, height))
+            bits ^= lowest
+        return list
+
+    def packBits(self):
+        """
+        Returns the same (width, height, bitPackedInts...) representation as
+        Grid.packBits.
+        """
+        bits = [self.width, self.height]
+        numCells = self.width * self.height
+        for start in range(0, numCells, self.CELLS_PER_INT):
+            currentInt = 0
+            for i in range(start, min(start + self.CELLS_PER_INT, numCells)):
+                if (self.bits >> i) & 1:
+                    currentInt += 2 ** (self.CELLS_PER_INT - (i % self.CELLS_PER_INT) - 1)
+            bits.append(currentInt)
+        if numCells % self.CELLS_PER_INT == 0:
+            bits.append(0)
+        return tuple(bits)
+
+
+class _BitColumn:
+    """
+    A view of column x of a BitGrid, so that grid[x][y] reads and writes bits.
+    """
+
+    def __init__(self, grid, x):
+        self.grid = grid
+        self.offset = x * grid.height
+
+    def __getitem__(self, y):
+        if y < 0:
+            y += self.grid.height
+        return (self.grid.bits >> (self.offset + y)) & 1 == 1
+
+    def __setitem__(self, y, value):
+        if y < 0:
+            y += self.grid.height
+        mask = 1 << (self.offset + y)
+        if value:
+            self.grid.bits |= mask
+        else:
+            self.grid.bits &= ~mask
+
+    def __iter__(self):
+        for y in range(self.grid.height):
+            yield self[y]
+
+    def __len__(self):
+        return self.grid.height
+
+
+if hasattr(int, 'bit_count'):
+    _popcount = int.bit_count
+else:
+    def _popcount(bits):
+        return bin(bits).count('1')
+
+
 def reconstituteGrid(bitRep):
     if type(bitRep) is not type((1, 2)):
         return bitRep
     width, height = bitRep[:2]
     return Grid(width, height, bitRepresentation=bitRep[2:])
 
+_ZOBRIST_FOOD, _ZOBRIST_CAPSULE, _ZOBRIST_AGENT, _ZOBRIST_SCARED = list(range(4))
+_ZOBRIST_MASK = (1 << 64) - 1
+_ZOBRIST_KEYS = {}
+_DIRECTION_CODES = {Directions.NORTH: 0, Directions.SOUTH: 1,
+                    Directions.EAST: 2, Directions.WEST: 3, Directions.STOP: 4}
+
+
+def zobristKey(*feature):
+    """
+    Returns a pseudo-random 64-bit key for a feature given as a tuple of ints,
+    e.g. (_ZOBRIST_FOOD, x, y).  The key is a splitmix64 scramble of the
+    feature itself rather than a draw from a seeded table, so it is the same
+    in every process and for every copy of a layout.
+    """
+    key = _ZOBRIST_KEYS.get(feature)
+    if key == None:
+        z = (hash(feature) + 0x9E3779B97F4A7C15) & _ZOBRIST_MASK
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _ZOBRIST_MASK
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _ZOBRIST_MASK
+        key = z ^ (z >> 31)
+        _ZOBRIST_KEYS[feature] = key
+    return key
+
+
 ####################################
 # Parts you shouldn't have to read #
 ####################################
@@ -394,18 +566,28 @@ class Actions:
 
 
 class GameStateData:
+    __slots__ = ('food', 'numFood', 'capsules', 'agentStates', 'layout', 'score', 'scoreChange',
+                 '_eaten', '_hash', '_foodList', '_foodEaten', '_foodAdded', '_capsuleEaten',
+                 '_agentMoved', '_lose', '_win')
 
     def __init__(self, prevState=None):
         """
         Generates a new data packet by copying information from its predecessor.
         """
         if prevState != None:
-            self.food = prevState.food.shallowCopy()
-            self.capsules = prevState.capsules[:]
+            # The food grid and capsule list are shared with the predecessor;
+            # the rules copy them before writing (see PacmanRules.consume).
+            self.food = prevState.food
+            self.numFood = prevState.numFood
+            self._foodList = prevState._foodList
+            self.capsules = prevState.capsules
             self.agentStates = self.copyAgentStates(prevState.agentStates)
             self.layout = prevState.layout
             self._eaten = prevState._eaten
             self.score = prevState.score
+            self._hash = prevState._hash
+        else:
+            self._hash = 0
 
         self._foodEaten = None
         self._foodAdded = None
@@ -418,18 +600,61 @@ class GameStateData:
     def deepCopy(self):
         state = GameStateData(self)
         state.food = self.food.deepCopy()
-        state.layout = self.layout.deepCopy()
+        state.capsules = self.capsules[:]
+        # The layout is static once loaded, so copies can share it
+        state.layout = self.layout
         state._agentMoved = self._agentMoved
         state._foodEaten = self._foodEaten
         state._foodAdded = self._foodAdded
         state._capsuleEaten = self._capsuleEaten
         return state
 
+    def eatFood(self, x, y):
+        """
+        Removes the pellet at (x,y), keeping the food count and food list
+        cache up to date.  The food grid is copied first, since it is shared
+        with the predecessor.
+        """
+        self.food = self.food.copy()
+        self.food[x][y] = False
+        self.numFood -= 1
+        self._foodList = None
+
+    def getFoodList(self):
+        """
+        The positions of the remaining pellets, as a tuple.  It is computed
+        from the food bits once and shared by successors that eat nothing.
+        """
+        if self._foodList is None:
+            self._foodList = tuple(self.food.asList())
+        return self._foodList
+
+    def getNearestFood(self, pos):
+        """
+        Returns (distance, position) of the pellet nearest to pos by maze
+        distance, or None if there is no food left.  Scans the cells in
+        order of their distance from pos (see Layout.getDistanceOrder), so it
+        usually stops after a few cells.
+        """
+        if self.numFood == 0:
+            return None
+        layout = self.layout
+        order = layout.getDistanceOrder()
+        distances = layout.getDistanceTable()
+        cells, cellIds = layout.getCells()
+        numCells = len(cells)
+        bits = self.food.bits
+        height = layout.height
+        source = cellIds[int(pos[0] + 0.5)][int(pos[1] + 0.5)]
+        row = source * numCells
+        for i in range(row, row + numCells):
+            x, y = cells[order[i]]
+            if (bits >> (x * height + y)) & 1:
+                return distances[row + order[i]], (x, y)
+        return None
+
     def copyAgentStates(self, agentStates):
-        copiedStates = []
-        for agentState in agentStates:
-            copiedStates.append(agentState.copy())
-        return copiedStates
+        return [agentState.copy() for agentState in agentStates]
 
     def __eq__(self, other):
         """
@@ -438,6 +663,8 @@ class GameStateData:
         if other == None:
             return False
         # TODO Check for type of other
+        if self._hash != other._hash:
+            return False
         if not self.agentStates == other.agentStates:
             return False
         if not self.food == other.food:
@@ -451,14 +678,60 @@ class GameStateData:
     def __hash__(self):
         """
         Allows states to be keys of dictionaries.
+
+        The Zobrist hash of the food, capsules and agents is maintained
+        incrementally (see updateHash), so this is O(1).
         """
-        for i, state in enumerate(self.agentStates):
-            try:
-                int(hash(state))
-            except TypeError as e:
-                print(e)
-                # hash(state)
-        return int((hash(tuple(self.agentStates)) + 13*hash(self.food) + 113 * hash(tuple(self.capsules)) + 7 * hash(self.score)) % 1048575)
+        return hash((self._hash, self.score))
+
+    def computeHash(self):
+        """
+        Computes the Zobrist hash of this state from scratch.
+        """
+        h = 0
+        for x, y in self.food.asList():
+            h ^= zobristKey(_ZOBRIST_FOOD, x, y)
+        for x, y in self.capsules:
+            h ^= zobristKey(_ZOBRIST_CAPSULE, x, y)
+        for index, agentState in enumerate(self.agentStates):
+            h ^= self._agentHash(index, agentState)
+        return h
+
+    def updateHash(self, prevState):
+        """
+        Derives this state's hash from that of its predecessor prevState by
+        folding in only what changed: the pellet and capsule eaten, and the
+        agents whose configuration or scared timer differ.
+        """
+        h = prevState._hash
+        if self._foodEaten != None:
+            h ^= zobristKey(_ZOBRIST_FOOD, *self._foodEaten)
+        if self._capsuleEaten != None:
+            h ^= zobristKey(_ZOBRIST_CAPSULE, *self._capsuleEaten)
+        for index, agentState in enumerate(self.agentStates):
+            prevAgentState = prevState.agentStates[index]
+            if agentState.configuration is not prevAgentState.configuration or \
+                    agentState.scaredTimer != prevAgentState.scaredTimer:
+                h ^= self._agentHash(index, prevAgentState)
+                h ^= self._agentHash(index, agentState)
+        self._hash = h
+
+    def _agentHash(self, index, agentState):
+        return self._agentKey(index, agentState.configuration, agentState.scaredTimer)
+
+    def _agentKey(self, index, conf, scaredTimer):
+        h = zobristKey(_ZOBRIST_SCARED, index, scaredTimer)
+        if conf != None:
+            x, y = conf.pos
+            h ^= zobristKey(_ZOBRIST_AGENT, index, int(2 * x), int(2 * y),
+                            _DIRECTION_CODES[conf.direction])
+        return h
+
+    def _foodKey(self, x, y):
+        return zobristKey(_ZOBRIST_FOOD, x, y)
+
+    def _capsuleKey(self, x, y):
+        return zobristKey(_ZOBRIST_CAPSULE, x, y)
 
     def __str__(self):
         width, height = self.layout.width, self.layout.height
@@ -519,6 +792,8 @@ class GameStateData:
         Creates an initial game state from a layout array (see layout.py).
         """
         self.food = layout.food.copy()
+        self.numFood = self.food.count()
+        self._foodList = None
         #self.capsules = []
         self.capsules = layout.capsules[:]
         self.layout = layout
@@ -536,6 +811,7 @@ class GameStateData:
             self.agentStates.append(AgentState(
                 Configuration(pos, Directions.STOP), isPacman))
         self._eaten = [False for a in self.agentStates]
+        self._hash = self.computeHash()
 
 
 try:
@@ -562,6 +838,7 @@ class Game:
         self.moveHistory = []
         self.totalAgentTimes = [0 for agent in agents]
         self.totalAgentTimeWarnings = [0 for agent in agents]
+        self.searchStats = [None for agent in agents]
         self.agentTimeout = False
         import io
         self.agentOutput = [io.StringIO() for agent in agents]
@@ -762,6 +1039,11 @@ class Game:
             if _BOINC_ENABLED:
                 boinc.set_fraction_done(self.getProgress())
 
+        # collect search statistics from agents that keep them
+        for agentIndex, agent in enumerate(self.agents):
+            if "getSearchStats" in dir(agent):
+                self.searchStats[agentIndex] = agent.getSearchStats()
+
         # inform a learning agent of the game result
         for agentIndex, agent in enumerate(self.agents):
             if "final" in dir(agent):
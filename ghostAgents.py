@@ -35,6 +35,14 @@ class GhostAgent(Agent):
         "Returns a Counter encoding a distribution over actions from the provided state."
         util.raiseNotDefined()
 
+    def sampleAction(self, state):
+        """
+        Draws an action from getDistribution(state).  Simulations call this
+        many times per move, so subclasses override it to sample without
+        building the Counter.
+        """
+        return self.getAction(state)
+
 
 class RandomGhost(GhostAgent):
     "A ghost that chooses a legal action uniformly at random."
@@ -46,6 +54,12 @@ class RandomGhost(GhostAgent):
         dist.normalize()
         return dist
 
+    def sampleAction(self, state):
+        legalActions = state.getLegalActions(self.index)
+        if not legalActions:
+            return Directions.STOP
+        return random.choice(legalActions)
+
 
 class DirectionalGhost(GhostAgent):
     "A ghost that prefers to rush Pacman, or flee when scared."
@@ -91,3 +105,42 @@ class DirectionalGhost(GhostAgent):
             dist[a] += (1-bestProb) / len(legalActions)
         dist.normalize()
         return dist
+
+    def sampleAction(self, state):
+        # Same distribution: with bestProb one of the best actions, else any
+        # legal action, each uniformly
+        legalActions = state.getLegalActions(self.index)
+        if not legalActions:
+            return Directions.STOP
+        ghostState = state.getGhostState(self.index)
+        isScared = ghostState.scaredTimer > 0
+        bestProb = self.prob_scaredFlee if isScared else self.prob_attack
+        if random.random() >= bestProb:
+            return random.choice(legalActions)
+        return random.choice(self.getBestActions(state, legalActions))
+
+    def getBestActions(self, state, legalActions=None):
+        """
+        The legal actions getDistribution favours, in legal order: those
+        that end closest to Pacman (furthest when scared), by Manhattan
+        distance.
+        """
+        if legalActions is None:
+            legalActions = state.getLegalActions(self.index)
+        ghostState = state.getGhostState(self.index)
+        isScared = ghostState.scaredTimer > 0
+        speed = 0.5 if isScared else 1
+        x, y = ghostState.configuration.pos
+        px, py = state.getPacmanPosition()
+        bestActions = []
+        bestScore = None
+        for a in legalActions:
+            dx, dy = Actions.directionToVector(a, speed)
+            distance = abs(x + dx - px) + abs(y + dy - py)
+            if isScared:
+                distance = -distance
+            if bestScore is None or distance < bestScore:
+                bestActions, bestScore = [a], distance
+            elif distance == bestScore:
+                bestActions.append(a)
+        return bestActions
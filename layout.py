@@ -14,11 +14,62 @@
 
 from util import manhattanDistance
 from game import Grid
+from game import BitGrid
+from game import Actions
 import os
+import sys
+import mmap
+import struct
+import hashlib
+import tempfile
 import random
-from functools import reduce
+from array import array
 
-VISIBILITY_MATRIX_CACHE = {}
+# Derived per-layout tables, keyed by (layout digest, artifact name)
+_ARTIFACTS = {}
+
+# Directory where derived tables are persisted between runs.  Set the
+# PACMAN_LAYOUT_CACHE environment variable to an empty string to disable it.
+CACHE_DIR = os.environ.get('PACMAN_LAYOUT_CACHE',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'pacman', 'layouts'))
+
+# Artifacts built by getLayout so that later processes can map them from disk
+PRECOMPUTED = ['distances']
+
+# Cache file header: magic, array typecode, byte order, artifact version,
+# item count
+_HEADER = struct.Struct('<6sccIQ')
+_MAGIC = b'PACLY2'
+
+# Array typecode and format version of each derived table.  Bump a version
+# whenever its builder or layout changes, so that cache files written by
+# older code are rebuilt.
+ARTIFACT_FORMATS = {
+    'distances': ('H', 1),
+    'distanceOrder': ('H', 1),
+    'actions': ('B', 1),
+    'ghostActions': ('B', 1),
+    'topology': ('H', 1),
+    'corridorEnds': ('H', 1),
+    'visibility': ('H', 1),
+}
+
+# Distance stored for pairs of cells that cannot reach each other
+UNREACHABLE = 0xFFFF
+
+# Fields of each cell's entry in the topology table (see Topology)
+TOPOLOGY_FIELDS = 5
+DEGREE, DEAD_END_DEPTH, DEAD_END_EXIT, CORRIDOR, COMPONENT_SIZE = range(TOPOLOGY_FIELDS)
+NO_CORRIDOR = 0xFFFF
+
+# Legal action masks: bit i stands for the i-th direction of
+# Actions._directionsAsList, and ACTIONS_BY_MASK decodes a mask into the
+# directions in that (Actions.getPossibleActions) order
+DIRECTION_BITS = dict((direction, 1 << i) for i, (direction, vector)
+                      in enumerate(Actions._directionsAsList))
+ACTIONS_BY_MASK = [tuple(direction for direction, vector in Actions._directionsAsList
+                         if mask & DIRECTION_BITS[direction])
+                   for mask in range(1 << len(Actions._directionsAsList))]
 
 
 class Layout:
@@ -30,41 +81,377 @@ class Layout:
         self.width = len(layoutText[0])
         self.height = len(layoutText)
         self.walls = Grid(self.width, self.height, False)
-        self.food = Grid(self.width, self.height, False)
+        self.food = BitGrid(self.width, self.height, False)
         self.capsules = []
         self.agentPositions = []
         self.numGhosts = 0
         self.processLayoutText(layoutText)
         self.layoutText = layoutText
-        self.totalFood = len(self.food.asList())
+        self.digest = hashlib.sha1('\n'.join(layoutText).encode()).hexdigest()
+        self.totalFood = self.food.count()
+        self.derived = {}
         # self.initializeVisibilityMatrix()
 
+    def __getstate__(self):
+        # Derived tables can be large and are cheap to look up again, so they
+        # are not pickled (e.g. when states are sent to worker processes).
+        state = self.__dict__.copy()
+        state['derived'] = {}
+        return state
+
     def getNumGhosts(self):
         return self.numGhosts
 
-    def initializeVisibilityMatrix(self):
-        global VISIBILITY_MATRIX_CACHE
-        if reduce(str.__add__, self.layoutText) not in VISIBILITY_MATRIX_CACHE:
-            from game import Directions
-            vecs = [(-0.5, 0), (0.5, 0), (0, -0.5), (0, 0.5)]
-            dirs = [Directions.NORTH, Directions.SOUTH,
-                    Directions.WEST, Directions.EAST]
-            vis = Grid(self.width, self.height, {Directions.NORTH: set(), Directions.SOUTH: set(
-            ), Directions.EAST: set(), Directions.WEST: set(), Directions.STOP: set()})
+    def getCells(self):
+        """
+        Numbers the non-wall cells.  Returns (cells, cellIds) where cells[i]
+        is the (x,y) position of cell i and cellIds[x][y] is the id of the
+        cell at (x,y), or -1 for walls.
+        """
+        if 'cells' not in self.derived:
+            cells = []
+            cellIds = [[-1] * self.height for x in range(self.width)]
             for x in range(self.width):
                 for y in range(self.height):
-                    if self.walls[x][y] == False:
-                        for vec, direction in zip(vecs, dirs):
-                            dx, dy = vec
-                            nextx, nexty = x + dx, y + dy
-                            while (nextx + nexty) != int(nextx) + int(nexty) or not self.walls[int(nextx)][int(nexty)]:
-                                vis[x][y][direction].add((nextx, nexty))
-                                nextx, nexty = x + dx, y + dy
-            self.visibility = vis
-            VISIBILITY_MATRIX_CACHE[reduce(str.__add__, self.layoutText)] = vis
-        else:
-            self.visibility = VISIBILITY_MATRIX_CACHE[reduce(
-                str.__add__, self.layoutText)]
+                    if not self.walls[x][y]:
+                        cellIds[x][y] = len(cells)
+                        cells.append((x, y))
+            self.derived['cells'] = (cells, cellIds)
+        return self.derived['cells']
+
+    def getNeighbors(self):
+        """
+        Returns a list mapping each cell id to the tuple of ids of its open
+        neighbors, in West, East, South, North order.
+        """
+        if 'neighbors' not in self.derived:
+            cells, cellIds = self.getCells()
+            neighbors = []
+            for x, y in cells:
+                adjacent = []
+                for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
+                    nx, ny = x + dx, y + dy
+                    if 0 <= nx < self.width and 0 <= ny < self.height and cellIds[nx][ny] >= 0:
+                        adjacent.append(cellIds[nx][ny])
+                neighbors.append(tuple(adjacent))
+            self.derived['neighbors'] = neighbors
+        return self.derived['neighbors']
+
+    def getDistanceTable(self):
+        """
+        Returns the all-pairs maze distance table: an array of unsigned shorts
+        where entry i * numCells + j is the shortest-path distance between
+        cells i and j (see getCells), or UNREACHABLE.
+
+        The table is built by a BFS from every cell the first time it is
+        needed and is shared by every Layout with the same text (see
+        getArtifact).
+        """
+        if 'distances' not in self.derived:
+            self.derived['distances'] = self.getArtifact('distances', self._buildDistanceTable)
+        return self.derived['distances']
+
+    def _buildDistanceTable(self):
+        neighbors = self.getNeighbors()
+        numCells = len(neighbors)
+        table = array('H', [UNREACHABLE]) * (numCells * numCells)
+        for source in range(numCells):
+            row = source * numCells
+            table[row + source] = 0
+            frontier = [source]
+            dist = 0
+            while frontier:
+                dist += 1
+                nextFrontier = []
+                for cell in frontier:
+                    for neighbor in neighbors[cell]:
+                        if table[row + neighbor] == UNREACHABLE:
+                            table[row + neighbor] = dist
+                            nextFrontier.append(neighbor)
+                frontier = nextFrontier
+        return table
+
+    def getDistanceOrder(self):
+        """
+        Returns an array of unsigned shorts where entries i * numCells to
+        (i + 1) * numCells - 1 list every cell id sorted by maze distance
+        from cell i (nearest first, unreachable cells last).
+        """
+        if 'distanceOrder' not in self.derived:
+            self.derived['distanceOrder'] = self.getArtifact('distanceOrder', self._buildDistanceOrder)
+        return self.derived['distanceOrder']
+
+    def _buildDistanceOrder(self):
+        distances = self.getDistanceTable()
+        numCells = len(self.getCells()[0])
+        order = array('H')
+        for source in range(numCells):
+            row = source * numCells
+            order.extend(sorted(range(numCells), key=lambda cell: distances[row + cell]))
+        return order
+
+    def getTopology(self):
+        """
+        Returns this layout's Topology: dead ends, corridors and junctions.
+        """
+        if 'topology' not in self.derived:
+            table = self.getArtifact('topology', self._buildTopologyTable)
+            corridorEnds = self.getArtifact('corridorEnds', self._buildCorridorEnds)
+            self.derived['topology'] = Topology(self, table, corridorEnds)
+        return self.derived['topology']
+
+    def _buildTopologyTable(self):
+        neighbors = self.getNeighbors()
+        numCells = len(neighbors)
+        degree = [len(adjacent) for adjacent in neighbors]
+
+        # Peel dead ends: each round removes the cells left with at most one
+        # neighbour.  Cells that are never removed lie on a loop.
+        never = numCells + 1
+        peelRound = [never] * numCells
+        remaining = list(degree)
+        frontier = [cell for cell in range(numCells) if degree[cell] <= 1]
+        for cell in frontier:
+            peelRound[cell] = 0
+        peel = 0
+        while frontier:
+            peel += 1
+            nextFrontier = []
+            for cell in frontier:
+                for neighbor in neighbors[cell]:
+                    if peelRound[neighbor] == never:
+                        remaining[neighbor] -= 1
+                        if remaining[neighbor] <= 1:
+                            peelRound[neighbor] = peel
+                            nextFrontier.append(neighbor)
+            frontier = nextFrontier
+
+        # A dead end hangs from the first cell outside it (or, in a part of
+        # the maze without loops, from the cells peeled last): its depth is
+        # the number of moves to get there
+        table = array('H', [0]) * (TOPOLOGY_FIELDS * numCells)
+        frontier = []
+        for cell in range(numCells):
+            if all(peelRound[neighbor] <= peelRound[cell] for neighbor in neighbors[cell]) \
+                    or peelRound[cell] == never:
+                table[TOPOLOGY_FIELDS * cell + DEAD_END_EXIT] = cell
+                frontier.append(cell)
+                peelRound[cell] = never
+        depth = 0
+        while frontier:
+            depth += 1
+            nextFrontier = []
+            for cell in frontier:
+                for neighbor in neighbors[cell]:
+                    if peelRound[neighbor] != never:
+                        peelRound[neighbor] = never
+                        table[TOPOLOGY_FIELDS * neighbor + DEAD_END_DEPTH] = depth
+                        table[TOPOLOGY_FIELDS * neighbor + DEAD_END_EXIT] = \
+                            table[TOPOLOGY_FIELDS * cell + DEAD_END_EXIT]
+                        nextFrontier.append(neighbor)
+            frontier = nextFrontier
+
+        # Corridors: connected runs of cells with exactly two neighbours
+        numCorridors = 0
+        for cell in range(numCells):
+            table[TOPOLOGY_FIELDS * cell + DEGREE] = degree[cell]
+            table[TOPOLOGY_FIELDS * cell + CORRIDOR] = NO_CORRIDOR
+        for start in range(numCells):
+            if degree[start] != 2 or table[TOPOLOGY_FIELDS * start + CORRIDOR] != NO_CORRIDOR:
+                continue
+            table[TOPOLOGY_FIELDS * start + CORRIDOR] = numCorridors
+            stack = [start]
+            while stack:
+                cell = stack.pop()
+                for neighbor in neighbors[cell]:
+                    if degree[neighbor] == 2 and table[TOPOLOGY_FIELDS * neighbor + CORRIDOR] == NO_CORRIDOR:
+                        table[TOPOLOGY_FIELDS * neighbor + CORRIDOR] = numCorridors
+                        stack.append(neighbor)
+            numCorridors += 1
+
+        # Connected parts of the maze
+        component = [-1] * numCells
+        for start in range(numCells):
+            if component[start] >= 0:
+                continue
+            component[start] = start
+            members = [start]
+            stack = [start]
+            while stack:
+                cell = stack.pop()
+                for neighbor in neighbors[cell]:
+                    if component[neighbor] < 0:
+                        component[neighbor] = start
+                        members.append(neighbor)
+                        stack.append(neighbor)
+            for cell in members:
+                table[TOPOLOGY_FIELDS * cell + COMPONENT_SIZE] = len(members)
+        return table
+
+    def _buildCorridorEnds(self):
+        table = self.getArtifact('topology', self._buildTopologyTable)
+        neighbors = self.getNeighbors()
+        corridorOf = [table[TOPOLOGY_FIELDS * cell + CORRIDOR] for cell in range(len(neighbors))]
+        numCorridors = max([c + 1 for c in corridorOf if c != NO_CORRIDOR] or [0])
+        ends = array('H', [UNREACHABLE]) * (2 * numCorridors)
+        for cell, corridor in enumerate(corridorOf):
+            if corridor == NO_CORRIDOR:
+                continue
+            for neighbor in neighbors[cell]:
+                if corridorOf[neighbor] != corridor:
+                    slot = 2 * corridor if ends[2 * corridor] == UNREACHABLE else 2 * corridor + 1
+                    ends[slot] = neighbor
+        return ends
+
+    def getSafeRegion(self):
+        """
+        Returns this layout's SafeRegion flood fill engine.
+        """
+        if 'safeRegion' not in self.derived:
+            self.derived['safeRegion'] = SafeRegion(self)
+        return self.derived['safeRegion']
+
+    def getActionMasks(self):
+        """
+        Returns (masks, ghostMasks), arrays of legal action masks (see
+        DIRECTION_BITS).  masks[i] holds the moves Actions.getPossibleActions
+        allows on cell i (see getCells).  ghostMasks[5 * i + h] holds the
+        moves a ghost on cell i heading in the h-th direction may make: no
+        STOP, and no reversing unless that is the only way out.
+        """
+        if 'actionMasks' not in self.derived:
+            masks = self.getArtifact('actions', self._buildActionMasks)
+            ghostMasks = self.getArtifact('ghostActions', self._buildGhostActionMasks)
+            self.derived['actionMasks'] = (masks, ghostMasks)
+        return self.derived['actionMasks']
+
+    def _buildActionMasks(self):
+        cells, cellIds = self.getCells()
+        masks = array('B', [0]) * len(cells)
+        for i, (x, y) in enumerate(cells):
+            for direction, (dx, dy) in Actions._directionsAsList:
+                nx, ny = x + dx, y + dy
+                if 0 <= nx < self.width and 0 <= ny < self.height and not self.walls[nx][ny]:
+                    masks[i] |= DIRECTION_BITS[direction]
+        return masks
+
+    def _buildGhostActionMasks(self):
+        masks = self.getArtifact('actions', self._buildActionMasks)
+        ghostMasks = array('B', [0]) * (len(Actions._directionsAsList) * len(masks))
+        for i, mask in enumerate(masks):
+            mask &= ~DIRECTION_BITS['Stop']
+            for h, (heading, vector) in enumerate(Actions._directionsAsList):
+                reverse = DIRECTION_BITS[Actions.reverseDirection(heading)]
+                ghostMask = mask
+                if mask & reverse and mask != reverse:
+                    ghostMask &= ~reverse
+                ghostMasks[len(Actions._directionsAsList) * i + h] = ghostMask
+        return ghostMasks
+
+    def getLegalActionTable(self):
+        """
+        Returns a dict from each open (x,y) cell to (actions, ghostActions),
+        where actions is the tuple of legal moves on that cell and
+        ghostActions maps a ghost's heading to its legal moves, decoded
+        from getActionMasks.
+        """
+        if 'legalActions' not in self.derived:
+            masks, ghostMasks = self.getActionMasks()
+            cells, cellIds = self.getCells()
+            numDirections = len(Actions._directionsAsList)
+            table = {}
+            for i, pos in enumerate(cells):
+                ghostActions = dict((heading, ACTIONS_BY_MASK[ghostMasks[numDirections * i + h]])
+                                    for h, (heading, vector) in enumerate(Actions._directionsAsList))
+                table[pos] = (ACTIONS_BY_MASK[masks[i]], ghostActions)
+            self.derived['legalActions'] = table
+        return self.derived['legalActions']
+
+    def getMazeDistance(self, pos1, pos2):
+        """
+        The length of the shortest path between pos1 and pos2 through the
+        maze, by table lookup.  Fractional positions (scared ghosts move at
+        half speed) are rounded to the nearest cell.  Returns UNREACHABLE if
+        either position is a wall or they are not connected.
+        """
+        table = self.getDistanceTable()
+        cells, cellIds = self.getCells()
+        x1, y1 = pos1
+        x2, y2 = pos2
+        i = cellIds[int(x1 + 0.5)][int(y1 + 0.5)]
+        j = cellIds[int(x2 + 0.5)][int(y2 + 0.5)]
+        if i < 0 or j < 0:
+            return UNREACHABLE
+        return table[i * len(cells) + j]
+
+    def getArtifact(self, name, build):
+        """
+        Returns the derived table called name for this layout, calling
+        build() to compute it (an array) only if it is neither in memory nor
+        in the on-disk cache.  Tables are keyed by a hash of the layout text,
+        so every Layout with the same text shares them.  Tables loaded from
+        disk are read-only memoryviews over a memory-mapped file.
+        """
+        key = (self.digest, name)
+        if key not in _ARTIFACTS:
+            table = _loadArtifact(self.digest, name)
+            if table is None:
+                table = build()
+                _saveArtifact(self.digest, name, table)
+            _ARTIFACTS[key] = table
+        return _ARTIFACTS[key]
+
+    def precompute(self):
+        """
+        Builds (or maps from the on-disk cache) every table in PRECOMPUTED.
+        """
+        for name in PRECOMPUTED:
+            if name == 'distances':
+                self.getDistanceTable()
+            elif name == 'visibility':
+                self.getVisibilityTable()
+
+    def getVisibilityTable(self):
+        """
+        Returns an array of unsigned shorts where entry 4 * i + d is the
+        number of open cells visible from cell i (see getCells) looking in
+        direction d, in West, East, South, North order.
+        """
+        if 'visibility' not in self.derived:
+            self.derived['visibility'] = self.getArtifact('visibility', self._buildVisibilityTable)
+        return self.derived['visibility']
+
+    def _buildVisibilityTable(self):
+        cells, cellIds = self.getCells()
+        table = array('H', [0]) * (4 * len(cells))
+        for i, (x, y) in enumerate(cells):
+            for d, (dx, dy) in enumerate([(-1, 0), (1, 0), (0, -1), (0, 1)]):
+                nextx, nexty = x + dx, y + dy
+                while 0 <= nextx < self.width and 0 <= nexty < self.height and not self.walls[nextx][nexty]:
+                    table[4 * i + d] += 1
+                    nextx, nexty = nextx + dx, nexty + dy
+        return table
+
+    def initializeVisibilityMatrix(self):
+        """
+        Sets self.visibility to a Grid mapping each open cell to a dict from
+        direction to the set of (half-step) positions visible that way.
+        """
+        from game import Directions
+        vecs = [(-0.5, 0), (0.5, 0), (0, -0.5), (0, 0.5)]
+        dirs = [Directions.WEST, Directions.EAST,
+                Directions.SOUTH, Directions.NORTH]
+        table = self.getVisibilityTable()
+        cells, cellIds = self.getCells()
+        vis = Grid(self.width, self.height, False)
+        for i, (x, y) in enumerate(cells):
+            vis[x][y] = {Directions.STOP: set()}
+            for d, ((dx, dy), direction) in enumerate(zip(vecs, dirs)):
+                # Every cell seen adds two half-steps, plus the half-step
+                # into the wall that ends the line of sight
+                steps = 2 * table[4 * i + d] + 1
+                vis[x][y][direction] = set((x + k * dx, y + k * dy) for k in range(1, steps + 1))
+        self.visibility = vis
 
     def isWall(self, pos):
         x, col = pos
@@ -137,6 +524,204 @@ class Layout:
             self.numGhosts += 1
 
 
+class Topology:
+    """
+    The static shape of a layout's maze, looked up per cell in O(1):
+
+    - degree: the number of open neighbours.  Junctions have three or more,
+      and the tip of a dead end has one.
+    - dead ends: the cells from which the only way back to a loop of the
+      maze is a single path.  Their depth is the length of that path, and
+      their exit is the cell it leads to.  Cells on loops have depth 0.
+    - corridors: connected runs of cells with exactly two neighbours.  The
+      cells just beyond their two ends are junctions or dead-end tips.
+    - the size of each cell's connected part of the maze.
+
+    The tables are layout artifacts (see Layout.getArtifact); positions are
+    rounded to the nearest cell, as in Layout.getMazeDistance.
+    """
+
+    def __init__(self, layout, table, corridorEnds):
+        self.cells, self.cellIds = layout.getCells()
+        self.table = table
+        self.corridorEnds = corridorEnds
+
+    def _field(self, pos, field):
+        x, y = pos
+        return self.table[TOPOLOGY_FIELDS * self.cellIds[int(x + 0.5)][int(y + 0.5)] + field]
+
+    def degree(self, pos):
+        return self._field(pos, DEGREE)
+
+    def isJunction(self, pos):
+        return self._field(pos, DEGREE) >= 3
+
+    def isDeadEndTip(self, pos):
+        """True on a cell with (at least) three walls around it."""
+        return self._field(pos, DEGREE) <= 1
+
+    def deadEndDepth(self, pos):
+        """How many moves pos is from the way out of its dead end (0 if none)."""
+        return self._field(pos, DEAD_END_DEPTH)
+
+    def deadEndExit(self, pos):
+        """The cell where pos's dead end joins the rest of the maze, or None."""
+        if self._field(pos, DEAD_END_DEPTH) == 0:
+            return None
+        return self.cells[self._field(pos, DEAD_END_EXIT)]
+
+    def corridorExits(self, pos):
+        """
+        The cells just beyond the two ends of the corridor through pos:
+        junctions or dead-end tips.  Empty if pos is not in a corridor, or
+        its corridor is a closed loop.
+        """
+        corridor = self._field(pos, CORRIDOR)
+        if corridor == NO_CORRIDOR:
+            return ()
+        ends = self.corridorEnds[2 * corridor:2 * corridor + 2]
+        return tuple(self.cells[end] for end in ends if end != UNREACHABLE)
+
+    def componentSize(self, pos):
+        return self._field(pos, COMPONENT_SIZE)
+
+
+class SafeRegion:
+    """
+    Counts the cells Pacman can reach from a position without stepping next
+    to a ghost (within Manhattan distance 1 of one).  The flood fill runs over
+    the layout's neighbour lists; visited and dangerous cells are marked in
+    two arrays with a stamp that changes every call, so nothing is cleared or
+    allocated between calls.  When no ghost is near enough to matter the
+    count comes from the layout's Topology instead.
+    """
+
+    def __init__(self, layout):
+        self.width = layout.width
+        self.height = layout.height
+        self.cells, self.cellIds = layout.getCells()
+        self.neighbors = layout.getNeighbors()
+        self.distances = layout.getDistanceTable()
+        self.topology = layout.getTopology()
+        # Each cell followed by its neighbours: the danger zone of a ghost
+        # standing on it
+        self.zones = [(i,) + adjacent for i, adjacent in enumerate(self.neighbors)]
+        self.visited = array('L', [0]) * len(self.cells)
+        self.danger = array('L', [0]) * len(self.cells)
+        self.stamp = 0
+
+    def size(self, pos, ghostPositions, limit=50):
+        """
+        The number of cells reachable from pos (which is counted even if it
+        is dangerous) through cells that are not next to any of the ghosts,
+        capped at limit.
+        """
+        # The fill stops after limit cells, all within limit - 1 moves of
+        # pos, and a ghost only endangers cells within one move of it: if no
+        # ghost is within limit moves, the walls alone decide
+        cellIds = self.cellIds
+        start = cellIds[int(pos[0])][int(pos[1])]
+        row = start * len(self.cells)
+        distances = self.distances
+        for gx, gy in ghostPositions:
+            if distances[row + cellIds[int(gx + 0.5)][int(gy + 0.5)]] <= limit:
+                break
+        else:
+            return min(limit, self.topology.table[TOPOLOGY_FIELDS * start + COMPONENT_SIZE])
+
+        self.stamp += 1
+        if self.stamp == 0xFFFFFFFF:
+            self.visited = array('L', [0]) * len(self.cells)
+            self.danger = array('L', [0]) * len(self.cells)
+            self.stamp = 1
+        stamp = self.stamp
+        visited, danger = self.visited, self.danger
+
+        for gx, gy in ghostPositions:
+            if gx == int(gx) and gy == int(gy):
+                for cell in self.zones[cellIds[int(gx)][int(gy)]]:
+                    danger[cell] = stamp
+            else:
+                # Scared ghosts move in half steps
+                for x in range(max(int(gx) - 1, 0), min(int(gx) + 3, self.width)):
+                    for y in range(max(int(gy) - 1, 0), min(int(gy) + 3, self.height)):
+                        if cellIds[x][y] >= 0 and abs(x - gx) + abs(y - gy) <= 1:
+                            danger[cellIds[x][y]] = stamp
+
+        neighbors = self.neighbors
+        visited[start] = stamp
+        stack = [start]
+        count = 0
+        while stack and count < limit:
+            cell = stack.pop()
+            count += 1
+            for neighbor in neighbors[cell]:
+                if visited[neighbor] != stamp and danger[neighbor] != stamp:
+                    visited[neighbor] = stamp
+                    stack.append(neighbor)
+        return count
+
+
+def _artifactPath(digest, name):
+    return os.path.join(CACHE_DIR, '%s-%s.bin' % (digest, name))
+
+
+def _loadArtifact(digest, name):
+    """
+    Maps a cached table from disk, or returns None if there is no usable
+    cache file for it: missing, corrupt, or written with another typecode
+    or version than ARTIFACT_FORMATS gives.
+    """
+    if not CACHE_DIR:
+        return None
+    try:
+        with open(_artifactPath(digest, name), 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if len(data) < _HEADER.size:
+        return None
+    magic, typecode, byteorder, version, count = _HEADER.unpack_from(data)
+    if magic != _MAGIC or byteorder != sys.byteorder[0].encode():
+        return None
+    try:
+        typecode = typecode.decode()
+    except UnicodeDecodeError:
+        return None
+    if (typecode, version) != ARTIFACT_FORMATS[name]:
+        return None
+    itemsize = array(typecode).itemsize
+    if len(data) != _HEADER.size + count * itemsize:
+        return None
+    if count == 0:
+        return array(typecode)
+    return memoryview(data)[_HEADER.size:].cast(typecode)
+
+
+def _saveArtifact(digest, name, table):
+    """
+    Writes a table to the cache directory.  The file is written under a
+    temporary name and renamed into place, so concurrent processes never
+    see a partial file.  Failures (e.g. a read-only home) are ignored.
+    """
+    if not CACHE_DIR:
+        return
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, tmpName = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_HEADER.pack(_MAGIC, table.typecode.encode(), sys.byteorder[0].encode(),
+                                     ARTIFACT_FORMATS[name][1], len(table)))
+                f.write(table.tobytes())
+            os.replace(tmpName, _artifactPath(digest, name))
+        except BaseException:
+            os.remove(tmpName)
+            raise
+    except OSError:
+        pass
+
+
 def getLayout(name, back=2):
     if name.endswith('.lay'):
         layout = tryToLoad('layouts/' + name)
@@ -151,6 +736,8 @@ def getLayout(name, back=2):
         os.chdir('..')
         layout = getLayout(name, back - 1)
         os.chdir(curdir)
+    if layout != None:
+        layout.precompute()
     return layout
 
 
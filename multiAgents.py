@@ -14,8 +14,20 @@
 
 from util import manhattanDistance
 from game import Directions
-import random, util
-from game import Agent
+import random, util, time, math
+from game import Agent, Actions
+
+try:
+    import numpy
+    _NUMPY_ENABLED = True
+except ImportError:
+    _NUMPY_ENABLED = False
+
+# Fewest sibling leaves worth a vectorized batch evaluation.  Below this
+# NumPy's per-call overhead costs more than it saves (betterEvaluationBatch
+# only beats the scalar function at 16-32 states), and evaluating them all
+# up front also gives up alpha-beta cutoffs among them.
+BATCH_MIN_LEAVES = 16
 
 
 class ReflexAgent(Agent):
@@ -127,6 +139,329 @@ def scoreEvaluationFunction(currentGameState):
     return currentGameState.getScore()
 
 
+class TranspositionTable:
+    """
+    A bounded cache of search results, keyed by (state hash, agent index,
+    remaining depth).  Each entry records the value, whether it is EXACT or
+    only a LOWER/UPPER bound (from an alpha-beta cutoff), and the best move.
+
+    The table has a fixed number of buckets with two slots each: a
+    depth-preferred slot, only replaced by results searched at least as deep,
+    and an always-replace slot that takes everything else.  Deep (expensive)
+    results therefore survive while recent shallow ones are still cached.
+
+    The table can be kept from one move to the next (see newSearch): entries
+    of earlier searches are aged, so they are found until something newer
+    needs their slot.
+    """
+    EXACT, LOWER, UPPER = 0, 1, 2
+
+    def __init__(self, size=65536):
+        self.numBuckets = max(1, int(size) // 2)
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self.clear()
+
+    def clear(self):
+        self.deep = [None] * self.numBuckets
+        self.deepGeneration = [0] * self.numBuckets
+        self.recent = [None] * self.numBuckets
+
+    def newSearch(self):
+        """
+        Starts a search that keeps the entries of the previous ones.  Their
+        depth-preferred slots can be taken by any result of the new search.
+        """
+        self.generation += 1
+
+    def lookup(self, key):
+        """
+        Returns the (key, depth, value, flag, move) entry for key, or None.
+        """
+        bucket = hash(key) % self.numBuckets
+        entry = self.deep[bucket]
+        if entry is None or entry[0] != key:
+            entry = self.recent[bucket]
+            if entry is None or entry[0] != key:
+                self.misses += 1
+                return None
+        self.hits += 1
+        return entry
+
+    def probe(self, key, alpha, beta):
+        """
+        Looks key up for a search with window (alpha, beta).  Returns
+        (value, move): value is the stored value if it settles the node (it
+        is exact, or a bound outside the window) and None otherwise; move is
+        the stored best move, or None if there is no entry.
+        """
+        entry = self.lookup(key)
+        if entry is None:
+            return None, None
+        _, _, value, flag, move = entry
+        if flag == TranspositionTable.EXACT or \
+                (flag == TranspositionTable.LOWER and value >= beta) or \
+                (flag == TranspositionTable.UPPER and value <= alpha):
+            return value, move
+        return None, move
+
+    def storeResult(self, key, depth, value, alphaOrig, betaOrig, move):
+        """
+        Stores the fail-soft value of a search with window (alphaOrig,
+        betaOrig): an upper bound if it failed low, a lower bound if it
+        failed high, and exact otherwise.
+        """
+        if value <= alphaOrig:
+            flag = TranspositionTable.UPPER
+        elif value >= betaOrig:
+            flag = TranspositionTable.LOWER
+        else:
+            flag = TranspositionTable.EXACT
+        self.store(key, depth, value, flag, move)
+
+    def bestMove(self, key):
+        """
+        Returns the best move stored for key, or None.  Only used for move
+        ordering, so it does not count as a lookup.
+        """
+        bucket = hash(key) % self.numBuckets
+        for entry in (self.deep[bucket], self.recent[bucket]):
+            if entry is not None and entry[0] == key:
+                return entry[4]
+        return None
+
+    def store(self, key, depth, value, flag, move):
+        bucket = hash(key) % self.numBuckets
+        entry = (key, depth, value, flag, move)
+        old = self.deep[bucket]
+        if old is None or depth >= old[1] or old[0] == key or \
+                self.deepGeneration[bucket] != self.generation:
+            self.deep[bucket] = entry
+            self.deepGeneration[bucket] = self.generation
+        else:
+            self.recent[bucket] = entry
+
+    def __len__(self):
+        return sum(1 for e in self.deep if e is not None) + \
+            sum(1 for e in self.recent if e is not None)
+
+    def report(self):
+        lookups = self.hits + self.misses
+        hitRate = 100.0 * self.hits / lookups if lookups else 0.0
+        return 'Transposition table: %d hits, %d misses (%.1f%% hit rate), %d/%d entries' % (
+            self.hits, self.misses, hitRate, len(self), 2 * self.numBuckets)
+
+
+class MoveOrderer:
+    """
+    Orders the moves at a search node without generating any successors:
+
+    - the transposition table's best move first,
+    - then up to two killer moves: moves that caused a cutoff at the same
+      ply elsewhere in the tree,
+    - then the rest by the history table, which scores (position, action)
+      pairs of each agent by the cutoffs they caused (depth squared each).
+
+    Remaining ties keep Pacman's legal move order, with STOP last, and put
+    ghost moves that get closest to Pacman first (furthest, for scared
+    ghosts).
+    """
+
+    def __init__(self):
+        self.killers = {}
+        self.history = {}
+
+    def newMove(self):
+        """
+        Called before each search: killers are relative to the root, so
+        they are dropped, and the history of earlier moves is aged.
+        """
+        self.killers = {}
+        for key in list(self.history):
+            self.history[key] //= 2
+            if self.history[key] == 0:
+                del self.history[key]
+
+    def order(self, state, agentIndex, actions, ply, ttMove=None):
+        agentState = state.data.agentStates[agentIndex]
+        pos = agentState.configuration.pos
+        history = self.history
+        if agentIndex == 0:
+            def key(action):
+                return (-history.get((0, pos, action), 0), action == Directions.STOP)
+        else:
+            pacmanPos = state.getPacmanPosition()
+            mazeDistance = state.data.layout.getMazeDistance
+            speed = 0.5 if agentState.scaredTimer > 0 else 1.0
+            sign = -1 if agentState.scaredTimer > 0 else 1
+
+            def key(action):
+                dx, dy = Actions.directionToVector(action, speed)
+                distance = mazeDistance((pos[0] + dx, pos[1] + dy), pacmanPos)
+                return (-history.get((agentIndex, pos, action), 0), sign * distance)
+
+        ordered = sorted(actions, key=key)
+        for move in reversed(self.killers.get(ply, [])):
+            if move in ordered:
+                ordered.remove(move)
+                ordered.insert(0, move)
+        if ttMove in ordered:
+            ordered.remove(ttMove)
+            ordered.insert(0, ttMove)
+        return ordered
+
+    def cutoff(self, state, agentIndex, action, ply, remainingDepth):
+        """
+        Records that action caused a cutoff at ply, remainingDepth plies
+        above the leaves.
+        """
+        killers = self.killers.setdefault(ply, [])
+        if action not in killers:
+            killers.insert(0, action)
+            del killers[2:]
+        key = (agentIndex, state.data.agentStates[agentIndex].configuration.pos, action)
+        self.history[key] = self.history.get(key, 0) + remainingDepth * remainingDepth
+
+
+class NullSearchStats:
+    """
+    The default search statistics collector: records nothing.
+
+    A collector is told about every successor the search generates, every
+    evaluation, every cutoff and every MCTS simulation, and brackets each
+    move with startMove and endMove.  Pick one with -a stats=1
+    (SearchStats) or stats=<class name>.
+    """
+
+    def reset(self):
+        pass
+
+    def startMove(self):
+        pass
+
+    def generated(self):
+        pass
+
+    def evaluated(self):
+        pass
+
+    def cutoff(self, ply):
+        pass
+
+    def simulated(self):
+        pass
+
+    def endMove(self, depth, numAgents):
+        pass
+
+    def counters(self):
+        return None
+
+    def merge(self, counters):
+        pass
+
+    def summary(self):
+        return None
+
+
+class SearchStats(NullSearchStats):
+    """
+    Records, for every move: successors generated, evaluation calls,
+    simulations, cutoffs by ply, the depth searched, the effective branching
+    factor and the time taken.  summary() returns them as a picklable dict,
+    which Game.run stores in game.searchStats.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.moves = []
+
+    def startMove(self):
+        self.nodes = 0
+        self.evaluations = 0
+        self.simulations = 0
+        self.cutoffs = {}
+        self.startTime = time.time()
+
+    def generated(self):
+        self.nodes += 1
+
+    def evaluated(self):
+        self.evaluations += 1
+
+    def cutoff(self, ply):
+        self.cutoffs[ply] = self.cutoffs.get(ply, 0) + 1
+
+    def simulated(self):
+        self.simulations += 1
+
+    def counters(self):
+        """
+        The counts of the current move so far, for merge (e.g. from a
+        worker process that searched part of the move).
+        """
+        return (self.nodes, self.evaluations, self.simulations, dict(self.cutoffs))
+
+    def merge(self, counters):
+        """Adds counters() of another collector to the current move."""
+        nodes, evaluations, simulations, cutoffs = counters
+        self.nodes += nodes
+        self.evaluations += evaluations
+        self.simulations += simulations
+        for ply, count in cutoffs.items():
+            self.cutoffs[ply] = self.cutoffs.get(ply, 0) + count
+
+    def endMove(self, depth, numAgents):
+        # N nodes in a uniform tree of d plies has branching factor N^(1/d)
+        plies = depth * numAgents
+        self.moves.append({
+            'nodes': self.nodes,
+            'evaluations': self.evaluations,
+            'simulations': self.simulations,
+            'cutoffs': self.cutoffs,
+            'depth': depth,
+            'branchingFactor': self.nodes ** (1.0 / plies) if plies > 0 and self.nodes > 0 else 0.0,
+            'time': time.time() - self.startTime,
+        })
+
+    def summary(self):
+        return {'moves': list(self.moves)}
+
+
+def formatSearchStats(summaries):
+    """
+    Aggregates SearchStats summaries (e.g. one per game) into a short report.
+    """
+    moves = [move for summary in summaries for move in summary['moves']]
+    if not moves:
+        return 'Search stats:  no moves'
+    n = float(len(moves))
+    cutoffs = {}
+    for move in moves:
+        for ply, count in move['cutoffs'].items():
+            cutoffs[int(ply)] = cutoffs.get(int(ply), 0) + count
+    lines = ['Search stats:  %d moves, %.1f nodes/move, %.1f evaluations/move, depth %.2f, branching factor %.2f, %.4f s/move' % (
+        len(moves), sum(m['nodes'] for m in moves) / n, sum(m['evaluations'] for m in moves) / n,
+        sum(m['depth'] for m in moves) / n, sum(m['branchingFactor'] for m in moves) / n,
+        sum(m['time'] for m in moves) / n)]
+    simulations = sum(m.get('simulations', 0) for m in moves)
+    if simulations:
+        lines.append('Simulations:   %.1f/move, %.0f/sec' % (
+            simulations / n, simulations / max(sum(m['time'] for m in moves), 1e-9)))
+    if cutoffs:
+        lines.append('Cutoffs/move:  ' + ', '.join(
+            ['ply %d: %.1f' % (ply, cutoffs[ply] / n) for ply in sorted(cutoffs)]))
+    return '\n'.join(lines)
+
+
+class SearchTimeout(Exception):
+    """Raised inside a search when the per-move time budget runs out."""
+    pass
+
+
 class MultiAgentSearchAgent(Agent):
     """
     This class provides some common elements to all of your
@@ -148,11 +483,179 @@ class MultiAgentSearchAgent(Agent):
 ########################
 
 
-    def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2'):
+    def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2', tt = '0', ttSize = '65536',
+                 timeBudget = '0', maxDepth = '100', stats = '0', batch = '0', succCache = '0',
+                 makeUnmake = '0', reuse = '1'):
         #两个可选参数，scoreEvaluationFunction和betterEva
         self.index = 0 # Pacman is always agent index 0
         self.evaluationFunction = util.lookup(evalFn, globals())
         self.depth = int(depth)
+        # -a timeBudget=秒 打开迭代加深，此时 depth 不再使用
+        self.timeBudget = float(timeBudget)
+        self.maxDepth = int(maxDepth)
+        self.deadline = None
+        self.searchedDepth = self.depth
+        # -a stats=1 统计每步的搜索量
+        if str(stats) == '0':
+            self.stats = NullSearchStats()
+        elif str(stats) == '1':
+            self.stats = SearchStats()
+        else:
+            self.stats = util.lookup(stats, globals())()
+        # -a batch=1（实验性）：评价函数有 batch 版本且装了 NumPy 时，最后一层至少有
+        # BATCH_MIN_LEAVES 个兄弟叶子的节点成批评价
+        self.batchEvaluation = None
+        if int(batch) and _NUMPY_ENABLED:
+            self.batchEvaluation = getattr(self.evaluationFunction, 'batch', None)
+        # -a makeUnmake=1：搜索在同一个 SearchState 上 apply/undo，不再逐节点复制状态
+        self.makeUnmake = bool(int(makeUnmake))
+        # -a succCache=N 打开容量为 N 的后继状态缓存（每步清空）
+        self.succCacheSize = int(succCache)
+        # -a tt=1,ttSize=N 打开置换表
+        self.transpositionTable = None
+        if int(tt):
+            self.transpositionTable = TranspositionTable(int(ttSize))
+        # -a reuse=0：每步从空的置换表开始；默认沿用上一步的搜索结果
+        self.reuse = bool(int(reuse))
+
+    def registerInitialState(self, state):
+        self.stats.reset()
+        if self.succCacheSize > 0:
+            # Runs in the process that plays the game (e.g. a --workers child)
+            type(state).enableSuccessorCache(self.succCacheSize)
+
+    def getSearchStats(self):
+        """
+        Returns this game's search statistics (see SearchStats.summary), or
+        None when they are not being collected.  Game.run stores the result
+        in game.searchStats.
+        """
+        return self.stats.summary()
+
+    def generateSuccessor(self, state, agentIndex, action):
+        """
+        All successor generation during search goes through here.  The
+        actions come from getLegalActions, so they are not validated again.
+        """
+        self.stats.generated()
+        return state.generateSuccessor(agentIndex, action, False)
+
+    def searchState(self, gameState):
+        """
+        The state a search from gameState works on: with makeUnmake, a
+        SearchState copy that makeMove changes in place, else gameState.
+        """
+        if self.makeUnmake:
+            return gameState.makeSearchState()
+        return gameState
+
+    def makeMove(self, state, agentIndex, action):
+        """
+        Returns the state after the move, for the search to descend into.
+        With makeUnmake that is state itself, changed in place, and the
+        caller must take the move back with unmakeMove; otherwise it is a new
+        successor (see generateSuccessor) and unmakeMove does nothing.
+        """
+        if self.makeUnmake:
+            self.stats.generated()
+            state.apply(agentIndex, action)
+            return state
+        return self.generateSuccessor(state, agentIndex, action)
+
+    def unmakeMove(self, state):
+        if self.makeUnmake:
+            state.undo()
+
+    def startSearch(self):
+        """
+        Called before each move's search.  With reuse the transposition
+        table keeps the previous searches' entries (see newSearch), otherwise
+        it is cleared.
+        """
+        if self.transpositionTable is not None:
+            if self.reuse:
+                self.transpositionTable.newSearch()
+            else:
+                self.transpositionTable.clear()
+
+    def previousBestMove(self, gameState):
+        """
+        With reuse, Pacman's best move from gameState as found by the
+        previous move's search, which saw it one round shallower; else None.
+        """
+        if not self.reuse or self.transpositionTable is None:
+            return None
+        return self.transpositionTable.bestMove((hash(gameState), 0, self.searchedDepth - 1))
+
+    def evaluate(self, state):
+        self.stats.evaluated()
+        return self.evaluationFunction(state)
+
+    def evaluateBatch(self, states):
+        """
+        Evaluates a list of states, with the evaluation function's vectorized
+        batch version when it has one (see betterEvaluationBatch).  Returns a
+        list of values equal to [self.evaluate(s) for s in states].  Fewer
+        than BATCH_MIN_LEAVES states are evaluated one by one.
+        """
+        if self.batchEvaluation is None or len(states) < BATCH_MIN_LEAVES:
+            return [self.evaluate(state) for state in states]
+        for state in states:
+            self.stats.evaluated()
+        return self.batchEvaluation(states).tolist()
+
+    def checkTime(self):
+        """
+        Searches call this at every node; it aborts the current iteration of
+        iterativeDeepening once the move's time budget is spent.
+        """
+        if self.deadline is not None and time.time() > self.deadline:
+            raise SearchTimeout()
+
+    def iterativeDeepening(self, gameState, actions, searchRoot):
+        """
+        Anytime search: runs searchRoot(gameState, actions) with self.depth set
+        to 1, 2, ... maxDepth until timeBudget seconds have passed, and returns
+        the best move of the deepest iteration that completed.
+
+        searchRoot must return (bestAction, values) where values maps each
+        searched root action to its value; each iteration searches the root
+        actions in the order of the previous iteration's values.  Depth 1 is
+        always completed so that there is a move to return.
+        """
+        startTime = time.time()
+        fixedDepth = self.depth
+        bestAction = None
+        try:
+            for depth in range(1, self.maxDepth + 1):
+                self.depth = depth
+                try:
+                    bestAction, values = searchRoot(gameState, actions)
+                except SearchTimeout:
+                    break
+                self.searchedDepth = depth
+                actions = sorted(actions, key=lambda a: values.get(a, float('-inf')), reverse=True)
+                self.deadline = startTime + self.timeBudget
+                if time.time() > self.deadline:
+                    break
+        finally:
+            self.depth = fixedDepth
+            self.deadline = None
+        return bestAction
+
+    def final(self, state):
+        """
+        Called by Game.run at the end of each game: reports and resets the
+        transposition table counters, clears the table so that the next game
+        does not depend on this one, and turns off the successor cache.
+        """
+        if self.succCacheSize > 0:
+            type(state).disableSuccessorCache()
+        if self.transpositionTable is not None:
+            print(self.transpositionTable.report())
+            self.transpositionTable.hits = 0
+            self.transpositionTable.misses = 0
+            self.transpositionTable.clear()
 
 
 class MinimaxAgent(MultiAgentSearchAgent):
@@ -185,14 +688,27 @@ class MinimaxAgent(MultiAgentSearchAgent):
         """
         "*** YOUR CODE HERE ***"
         
+        table = self.transpositionTable
+
         def minimax(state, agentIndex, depth):
             # Terminal Case: Win/Lose or depth reached (depth counts by Pacman moves)
             if state.isWin() or state.isLose() or depth == self.depth:
-                return self.evaluationFunction(state), None
-
+                return self.evaluate(state), None
+
+            if table is not None:
+                key = (hash(state), agentIndex, self.depth - depth)
+                entry = table.lookup(key)
+                if entry is not None:
+                    return entry[2], entry[4]
+                value, action = search(state, agentIndex, depth)
+                table.store(key, self.depth - depth, value, TranspositionTable.EXACT, action)
+                return value, action
+            return search(state, agentIndex, depth)
+
+        def search(state, agentIndex, depth):
             actions = state.getLegalActions(agentIndex)
             if not actions:
-                return self.evaluationFunction(state), None
+                return self.evaluate(state), None
 
             numAgents = state.getNumAgents()
 
@@ -201,8 +717,9 @@ class MinimaxAgent(MultiAgentSearchAgent):
                 bestValue = float('-inf')
                 bestAction = None
                 for action in actions:
-                    successor = state.generateSuccessor(agentIndex, action)
+                    successor = self.makeMove(state, agentIndex, action)
                     value, _ = minimax(successor, 1, depth)  # next is ghost, depth stays same
+                    self.unmakeMove(state)
                     if value > bestValue:
                         bestValue = value
                         bestAction = action
@@ -215,13 +732,14 @@ class MinimaxAgent(MultiAgentSearchAgent):
                 nextAgent = (agentIndex + 1) % numAgents
 
                 for action in actions:
-                    successor = state.generateSuccessor(agentIndex, action)
+                    successor = self.makeMove(state, agentIndex, action)
 
                     # If next agent is Pacman, depth increases (one "ply" completed)
                     if nextAgent == 0:
                         value, _ = minimax(successor, nextAgent, depth + 1)
                     else:
                         value, _ = minimax(successor, nextAgent, depth)
+                    self.unmakeMove(state)
 
                     if value < bestValue:
                         bestValue = value
@@ -230,7 +748,10 @@ class MinimaxAgent(MultiAgentSearchAgent):
                 return bestValue, bestAction
 
         # Start from Pacman (agentIndex = 0), at depth 0
-        _, action = minimax(gameState, 0, 0)
+        self.startSearch()
+        self.stats.startMove()
+        _, action = minimax(self.searchState(gameState), 0, 0)
+        self.stats.endMove(self.depth, gameState.getNumAgents())
         return action
 
 class AlphaBetaAgent(MultiAgentSearchAgent):
@@ -239,48 +760,220 @@ class AlphaBetaAgent(MultiAgentSearchAgent):
     - 使用 betterEvaluationFunction
     - 优先安全路径
     - 避免两侧被鬼夹击
+
+    With -a parallel=N the root moves are searched on N worker processes
+    (see searchRootParallel).  With -a ghostRadius=R only the ghosts within
+    R of Pacman are branched on (see abstractGhostActions).
     """
 
+    def __init__(self, parallel = '0', ordering = 'history', ghostRadius = '0', **kwargs):
+        MultiAgentSearchAgent.__init__(self, **kwargs)
+        self.parallel = int(parallel)
+        # -a ghostRadius=R：离 Pacman 迷宫距离超过 R 的鬼不再分支，只走 DirectionalGhost 最可能的一步
+        self.ghostRadius = int(ghostRadius)
+        self.ghostModels = {}
+        # -a ordering=safe：旧的排序方式，按每个后继的 safeScore 排 Pacman 的动作
+        self.moveOrderer = None
+        if ordering == 'history':
+            self.moveOrderer = MoveOrderer()
+        elif ordering != 'safe':
+            raise Exception('Unknown move ordering: ' + ordering)
+        self.pool = None
+        self.rootBounds = None
+        # 每一步搜索的编号，worker 据此知道何时开始新的一步
+        self.searchId = 0
+
+    def __getstate__(self):
+        # The worker pool cannot be pickled (and is not needed by copies of
+        # the agent sent to other processes).
+        state = self.__dict__.copy()
+        state['pool'] = None
+        state['rootBounds'] = None
+        return state
+
     def getAction(self, gameState):
-        numAgents = gameState.getNumAgents()
+        self.startSearch()
+        if self.moveOrderer is not None:
+            self.moveOrderer.newMove()
+        self.searchId += 1
+        actions = gameState.getLegalActions(0)
+        pvMove = self.previousBestMove(gameState)
+        if pvMove in actions:
+            # 上一步搜索的主变例走法先搜，alpha 一开始就接近最终值
+            actions.remove(pvMove)
+            actions.insert(0, pvMove)
+        self.stats.startMove()
+        if self.timeBudget > 0:
+            bestAction = self.iterativeDeepening(gameState, actions, self.searchRoot)
+        else:
+            bestAction, _ = self.searchRoot(gameState, actions)
+            self.searchedDepth = self.depth
+        self.stats.endMove(self.searchedDepth, gameState.getNumAgents())
+        return bestAction
+
+    def final(self, state):
+        """
+        Also shuts down the worker pool, so that the next game starts with
+        fresh workers (and fresh worker transposition tables).
+        """
+        MultiAgentSearchAgent.final(self, state)
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+            self.rootBounds = None
+
+    def searchRoot(self, gameState, actions):
+        """
+        Searches each root action in order to self.depth and returns
+        (bestAction, {action: value}).
+
+        Equal values are resolved by the order of getLegalActions, not by
+        the search order, so reordering the root (previous best move first,
+        iterative deepening) only changes the speed of the search.  A move
+        that comes before the current best in legal order is searched with
+        alpha just below the best value, so that a tie is seen exactly
+        instead of as a fail-low bound.
+        """
+        if self.parallel > 1 and len(actions) > 1 and not _inWorkerProcess():
+            return self.searchRootParallel(gameState, actions)
+        rank = _legalRank(gameState)
         alpha, beta = float('-inf'), float('inf')
         bestAction = None
         bestValue = float('-inf')
+        values = {}
+        state = self.searchState(gameState)
 
-        for action in gameState.getLegalActions(0):
+        for action in actions:
             if action == "STOP":
                 continue  # 不停留
-            successor = gameState.generateSuccessor(0, action)
-            value = self.alphabeta(successor, 0, 1, alpha, beta)
-            if value > bestValue:
+            successor = self.makeMove(state, 0, action)
+            if bestAction is not None and rank[action] < rank[bestAction]:
+                value = self.alphabeta(successor, 0, 1, math.nextafter(alpha, float('-inf')), beta)
+                better = value >= bestValue
+            else:
+                value = self.alphabeta(successor, 0, 1, alpha, beta)
+                better = value > bestValue
+            self.unmakeMove(state)
+            values[action] = value
+            if better:
                 bestValue = value
                 bestAction = action
             alpha = max(alpha, bestValue)
 
-        return bestAction
+        return bestAction, values
+
+    def searchRootParallel(self, gameState, actions):
+        """
+        Young Brothers Wait root splitting.  The first root move is searched
+        here with a full window to get a bound, then the remaining moves are
+        searched concurrently on the worker pool.  Each worker starts with
+        alpha set to the best value already published (in rootBounds) by the
+        moves *before* it in root order, and publishes its own value when it
+        finishes.  Tasks carry searchId, so a worker starts a new search
+        (transposition table generation, killer moves) once per move like
+        the agent itself.  Each task returns the worker's search statistics
+        and explored count along with the value, and they are added to this
+        process's, so the move's totals include the workers' nodes.
+
+        Only earlier moves may raise a move's alpha, which is exactly the
+        bound the serial loop would have used or a lower one, so the move
+        returned is the same as searchRoot's.  As there, a move that comes
+        before an earlier-searched move in legal order is searched with
+        alpha just below the published bound, and ties go to the move that
+        comes first in legal order.
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        actions = [a for a in actions if a != "STOP"]
+        if self.pool is None:
+            import multiprocessing
+            self.rootBounds = multiprocessing.Array('d', 5, lock=False)
+            self.pool = ProcessPoolExecutor(max_workers=self.parallel, initializer=_initSearchWorker,
+                                            initargs=(self, self.rootBounds))
+
+        first = actions[0]
+        state = self.searchState(gameState)
+        values = {first: self.alphabeta(self.makeMove(state, 0, first), 0, 1,
+                                        float('-inf'), float('inf'))}
+        self.unmakeMove(state)
+        for i in range(len(self.rootBounds)):
+            self.rootBounds[i] = float('nan')
+        self.rootBounds[0] = values[first]
+
+        rank = _legalRank(gameState)
+        futures = [(action, self.pool.submit(_searchRootChild, gameState, i, action,
+                                              self.depth, self.deadline, self.searchId,
+                                              rank[action] < max(rank[a] for a in actions[:i])))
+                   for i, action in enumerate(actions) if i > 0]
+        for action, future in futures:
+            values[action], counters, explored = future.result()
+            self.stats.merge(counters)
+            gameState.addExploredCount(explored)
+        if None in values.values():
+            raise SearchTimeout()
+
+        bestAction = max(actions, key=lambda a: (values[a], -rank[a]))
+        return bestAction, values
 
     def alphabeta(self, state, depth, agentIndex, alpha, beta):
         numAgents = state.getNumAgents()
+        self.checkTime()
         isPacman = (agentIndex == 0)
 
         if state.isWin() or state.isLose() or depth == self.depth:
-            return self.evaluationFunction(state)
+            return self.evaluate(state)
+
+        table = self.transpositionTable
+        ttMove = None
+        if table is not None:
+            key = (hash(state), agentIndex, self.depth - depth)
+            ttValue, ttMove = table.probe(key, alpha, beta)
+            if ttValue is not None:
+                return ttValue
+            if ttMove is None and self.reuse:
+                # 上一步的搜索见过这个节点，剩余深度少一轮：借它的最佳走法排序
+                ttMove = table.bestMove((key[0], agentIndex, self.depth - depth - 1))
+            alphaOrig, betaOrig = alpha, beta
 
         actions = state.getLegalActions(agentIndex)
         if not actions:
-            return self.evaluationFunction(state)
+            return self.evaluate(state)
+        if not isPacman and self.ghostRadius > 0 and len(actions) > 1:
+            actions = self.abstractGhostActions(state, agentIndex, actions)
+
+        bestAction = None
+        ply = depth * numAgents + agentIndex
+        orderer = self.moveOrderer
+        successors = {}
+        if orderer is not None:
+            actions = orderer.order(state, agentIndex, actions, ply, ttMove)
+        elif isPacman:
+            # 优先按安全路径评分排序（后继只生成一次，搜索时复用）
+            for a in actions:
+                successors[a] = self.generateSuccessor(state, 0, a)
+            actions = sorted(actions, key=lambda a: self.safeScore(successors[a]), reverse=True)
+            if self.makeUnmake:
+                successors = {}  # 搜索仍在 state 上 apply/undo
+        if orderer is None and ttMove in actions:
+            actions.remove(ttMove)
+            actions.insert(0, ttMove)
 
         if isPacman:
             value = float('-inf')
-            # 优先按安全路径评分排序
-            actions = sorted(actions, key=lambda a: self.safeScore(state.generateSuccessor(0, a)), reverse=True)
             for action in actions:
-                successor = state.generateSuccessor(agentIndex, action)
-                value = max(value, self.alphabeta(successor, depth, 1, alpha, beta))
+                if action in successors:
+                    childValue = self.alphabeta(successors[action], depth, 1, alpha, beta)
+                else:
+                    successor = self.makeMove(state, agentIndex, action)
+                    childValue = self.alphabeta(successor, depth, 1, alpha, beta)
+                    self.unmakeMove(state)
+                if childValue > value:
+                    value, bestAction = childValue, action
                 alpha = max(alpha, value)
                 if value >= beta:
+                    self.stats.cutoff(ply)
+                    if orderer is not None:
+                        orderer.cutoff(state, agentIndex, action, ply, self.depth - depth)
                     break  # 剪枝
-            return value
         else:
             value = float('inf')
             nextAgent = agentIndex + 1
@@ -288,13 +981,48 @@ class AlphaBetaAgent(MultiAgentSearchAgent):
             if nextAgent == numAgents:
                 nextAgent = 0
                 nextDepth += 1
+            if nextDepth == self.depth and self.batchEvaluation is not None and \
+                    len(actions) >= BATCH_MIN_LEAVES:
+                # 子节点全是叶子且足够多：一次性成批评价，再按原顺序走剪枝循环
+                leaves = [self.generateSuccessor(state, agentIndex, a) for a in actions]
+                childValues = iter(self.evaluateBatch(leaves))
+            else:
+                childValues = None
             for action in actions:
-                successor = state.generateSuccessor(agentIndex, action)
-                value = min(value, self.alphabeta(successor, nextDepth, nextAgent, alpha, beta))
+                if childValues is not None:
+                    childValue = next(childValues)
+                else:
+                    successor = self.makeMove(state, agentIndex, action)
+                    childValue = self.alphabeta(successor, nextDepth, nextAgent, alpha, beta)
+                    self.unmakeMove(state)
+                if childValue < value:
+                    value, bestAction = childValue, action
                 beta = min(beta, value)
                 if value <= alpha:
+                    self.stats.cutoff(ply)
+                    if orderer is not None:
+                        orderer.cutoff(state, agentIndex, action, ply, self.depth - depth)
                     break
-            return value
+
+        if table is not None:
+            table.storeResult(key, self.depth - depth, value, alphaOrig, betaOrig, bestAction)
+        return value
+
+    def abstractGhostActions(self, state, agentIndex, actions):
+        """
+        The ghost replies to branch on: all of them for a ghost within
+        ghostRadius of Pacman (maze distance), else only the first of the
+        moves DirectionalGhost would favour, as if the ghost were
+        deterministic.
+        """
+        pos = state.data.agentStates[agentIndex].configuration.pos
+        if state.data.layout.getMazeDistance(pos, state.getPacmanPosition()) <= self.ghostRadius:
+            return actions
+        ghost = self.ghostModels.get(agentIndex)
+        if ghost is None:
+            import ghostAgents
+            ghost = self.ghostModels[agentIndex] = ghostAgents.DirectionalGhost(agentIndex)
+        return ghost.getBestActions(state, actions)[:1]
 
     def safeScore(self, state):
         """
@@ -302,8 +1030,6 @@ class AlphaBetaAgent(MultiAgentSearchAgent):
         """
         pacmanPos = state.getPacmanPosition()
         ghosts = state.getGhostStates()
-        walls = state.getWalls()
-        from util import manhattanDistance
 
         # 检查左右是否有鬼堵住
         x, y = pacmanPos
@@ -313,29 +1039,476 @@ class AlphaBetaAgent(MultiAgentSearchAgent):
         if leftDanger >= 2 and rightDanger >= 2:
             dangerScore -= 200  # 左右都被鬼堵，危险
 
-        # BFS 安全路径长度
-        import queue
-        visited = set()
-        q = queue.Queue()
-        q.put((pacmanPos, 0))
-        visited.add(pacmanPos)
-        safe_count = 0
-        while not q.empty() and safe_count < 50:
-            current, dist = q.get()
-            cx, cy = current
-            if walls[cx][cy]:
-                continue
-            safe_count += 1
-            for dx, dy in [(-1,0),(1,0),(0,-1),(0,1)]:
-                nx, ny = cx+dx, cy+dy
-                if (nx, ny) not in visited and not walls[nx][ny]:
-                    if all(manhattanDistance((nx, ny), g.getPosition()) > 1 for g in ghosts):
-                        visited.add((nx, ny))
-                        q.put(((nx, ny), dist+1))
+        # 安全区域大小（只关心是否小于 3）
+        ghostPositions = [g.getPosition() for g in ghosts]
+        safe_count = state.data.layout.getSafeRegion().size(pacmanPos, ghostPositions, 3)
         if safe_count < 3:
             dangerScore -= 300  # 死路
 
-        return self.evaluationFunction(state) + dangerScore
+        return self.evaluate(state) + dangerScore
+
+
+class ExpectimaxAgent(MultiAgentSearchAgent):
+    """
+    Expectimax against the ghosts' own move distributions: each ghost reply
+    is weighted by getDistribution of the ghost agent class named by
+    -a ghostModel (RandomGhost or DirectionalGhost, as passed to -g).
+
+    With a finite -a evalMargin, chance nodes are pruned with Ballard's
+    Star1: leaf values are clamped to [lowerBound, upperBound] (the score at
+    the root -/+ evalMargin), so once some replies have been searched the
+    rest can only move the expected value within known bounds, and each
+    reply is searched with the window that would make the node cut.  With
+    -a star=2, Star2 also probes one Pacman move after every reply of the
+    last ghost to get lower bounds first; without min nodes between the
+    chance nodes these probes rarely cut, so it is off by default.
+
+    The clamp changes the values being searched: betterEvaluationFunction
+    scores a ghost collision at -999999, which any margin below that turns
+    into the lower bound, so death weighs less in the expectations than the
+    ghost model says.  The default margin is therefore infinite (no clamp,
+    and so no Star1 cuts); a finite one trades exactness for speed.
+    """
+
+    def __init__(self, ghostModel = 'RandomGhost', star = '1', evalMargin = 'inf', **kwargs):
+        MultiAgentSearchAgent.__init__(self, **kwargs)
+        import ghostAgents
+        # -a ghostModel=鬼的类型：按这个类的 getDistribution 给鬼的动作加权
+        self.ghostType = getattr(ghostAgents, ghostModel)
+        self.ghostModels = {}
+        # -a star=0/1/2：机会节点不剪枝 / Star1 / Star1+Star2
+        self.star = int(star)
+        # -a evalMargin=M：叶子值截到根局面分数 ±M 之内，剪枝靠这个上下界；M 有限时
+        # 返回的值会被改变（如死亡只算到下界），默认 inf 不截断
+        self.evalMargin = float(evalMargin)
+        self.lowerBound = float('-inf')
+        self.upperBound = float('inf')
+        self.moveOrderer = MoveOrderer()
+
+    def getAction(self, gameState):
+        if self.transpositionTable is not None:
+            # With a finite evalMargin leaf values are clamped to bounds that
+            # move with the score, so entries of earlier moves are not valid
+            self.transpositionTable.clear()
+        self.moveOrderer.newMove()
+        self.lowerBound = gameState.getScore() - self.evalMargin
+        self.upperBound = gameState.getScore() + self.evalMargin
+        actions = gameState.getLegalActions(0)
+        self.stats.startMove()
+        if self.timeBudget > 0:
+            bestAction = self.iterativeDeepening(gameState, actions, self.searchRoot)
+        else:
+            bestAction, _ = self.searchRoot(gameState, actions)
+            self.searchedDepth = self.depth
+        self.stats.endMove(self.searchedDepth, gameState.getNumAgents())
+        return bestAction
+
+    def searchRoot(self, gameState, actions):
+        """
+        Searches each root action in order to self.depth and returns
+        (bestAction, {action: value}).  Actions that cannot beat the best
+        one so far get an upper bound as their value.
+        """
+        alpha = self.lowerBound
+        bestAction = None
+        bestValue = float('-inf')
+        values = {}
+        state = self.searchState(gameState)
+
+        for action in actions:
+            successor = self.makeMove(state, 0, action)
+            value = self.expectimax(successor, 0, 1, alpha, self.upperBound)
+            self.unmakeMove(state)
+            values[action] = value
+            if value > bestValue:
+                bestValue = value
+                bestAction = action
+            alpha = max(alpha, bestValue)
+
+        return bestAction, values
+
+    def ghostDistribution(self, state, agentIndex):
+        """
+        Returns the [(action, probability)] of the modelled ghost's replies,
+        most likely first (ties in legal order).
+        """
+        ghost = self.ghostModels.get(agentIndex)
+        if ghost is None:
+            ghost = self.ghostModels[agentIndex] = self.ghostType(agentIndex)
+        dist = ghost.getDistribution(state)
+        outcomes = [(action, p) for action, p in dist.items() if p > 0]
+        outcomes.sort(key=lambda outcome: -outcome[1])
+        return outcomes
+
+    def leafValue(self, state):
+        return min(self.upperBound, max(self.lowerBound, self.evaluate(state)))
+
+    def expectimax(self, state, depth, agentIndex, alpha, beta):
+        """
+        Fail-soft value of state within (alpha, beta): exact inside the
+        window, an upper bound when <= alpha and a lower bound when >= beta.
+        """
+        self.checkTime()
+        if state.isWin() or state.isLose() or depth == self.depth:
+            return self.leafValue(state)
+
+        table = self.transpositionTable
+        ttMove = None
+        if table is not None:
+            key = (hash(state), agentIndex, self.depth - depth)
+            ttValue, ttMove = table.probe(key, alpha, beta)
+            if ttValue is not None:
+                return ttValue
+            alphaOrig, betaOrig = alpha, beta
+
+        if agentIndex == 0:
+            value, bestAction = self.maxValue(state, depth, alpha, beta, ttMove)
+        else:
+            value, bestAction = self.chanceValue(state, depth, agentIndex, alpha, beta), None
+
+        if table is not None:
+            table.storeResult(key, self.depth - depth, value, alphaOrig, betaOrig, bestAction)
+        return value
+
+    def maxValue(self, state, depth, alpha, beta, ttMove):
+        actions = state.getLegalActions(0)
+        if not actions:
+            return self.leafValue(state), None
+        ply = depth * state.getNumAgents()
+        value = float('-inf')
+        bestAction = None
+        for action in self.moveOrderer.order(state, 0, actions, ply, ttMove):
+            successor = self.makeMove(state, 0, action)
+            childValue = self.expectimax(successor, depth, 1, alpha, beta)
+            self.unmakeMove(state)
+            if childValue > value:
+                value, bestAction = childValue, action
+            alpha = max(alpha, value)
+            if value >= beta:
+                self.stats.cutoff(ply)
+                self.moveOrderer.cutoff(state, 0, action, ply, self.depth - depth)
+                break
+        return value, bestAction
+
+    def chanceValue(self, state, depth, agentIndex, alpha, beta):
+        outcomes = self.ghostDistribution(state, agentIndex)
+        if not outcomes:
+            return self.leafValue(state)
+        numAgents = state.getNumAgents()
+        ply = depth * numAgents + agentIndex
+        nextAgent = agentIndex + 1
+        nextDepth = depth
+        if nextAgent == numAgents:
+            nextAgent = 0
+            nextDepth += 1
+        L, U = self.lowerBound, self.upperBound
+
+        if self.star == 0 or math.isinf(L) or math.isinf(U):
+            # Star1 needs finite bounds on the unsearched replies
+            value = 0.0
+            for action, p in outcomes:
+                successor = self.makeMove(state, agentIndex, action)
+                value += p * self.expectimax(successor, nextDepth, nextAgent, L, U)
+                self.unmakeMove(state)
+            return value
+
+        # 每个后继值的下界：默认 L；Star2 用探测得到的下界
+        bounds = [L] * len(outcomes)
+        lowerRest = sum(p for _, p in outcomes) * L
+        if self.star >= 2 and nextAgent == 0 and nextDepth < self.depth:
+            for i, (action, p) in enumerate(outcomes):
+                successor = self.makeMove(state, agentIndex, action)
+                bounds[i] = self.probe(successor, nextDepth, (beta - lowerRest + p * L) / p)
+                self.unmakeMove(state)
+                lowerRest += p * (bounds[i] - L)
+                if lowerRest >= beta:
+                    self.stats.cutoff(ply)
+                    return lowerRest
+
+        # Star1：已搜的期望值加上其余后继的上/下界决定能否剪枝
+        value = 0.0
+        upperRest = sum(p for _, p in outcomes) * U
+        for i, (action, p) in enumerate(outcomes):
+            lowerRest -= p * bounds[i]
+            upperRest -= p * U
+            childAlpha = max(L, (alpha - value - upperRest) / p)
+            childBeta = min(U, (beta - value - lowerRest) / p)
+            successor = self.makeMove(state, agentIndex, action)
+            value += p * self.expectimax(successor, nextDepth, nextAgent, childAlpha, childBeta)
+            self.unmakeMove(state)
+            if value + upperRest <= alpha:
+                self.stats.cutoff(ply)
+                return value + upperRest
+            if value + lowerRest >= beta:
+                self.stats.cutoff(ply)
+                return value + lowerRest
+        return value
+
+    def probe(self, state, depth, beta):
+        """
+        Star2 probe of a Pacman node: a lower bound on its value from the
+        transposition table or from searching only its first move, with the
+        search stopping once it reaches beta.
+        """
+        L = self.lowerBound
+        if state.isWin() or state.isLose() or depth == self.depth:
+            return self.leafValue(state)
+        actions = state.getLegalActions(0)
+        if not actions:
+            return self.leafValue(state)
+        ttMove = None
+        table = self.transpositionTable
+        if table is not None:
+            entry = table.lookup((hash(state), 0, self.depth - depth))
+            if entry is not None:
+                _, _, ttValue, flag, ttMove = entry
+                if flag != TranspositionTable.UPPER:
+                    return max(L, ttValue)
+        ply = depth * state.getNumAgents()
+        action = self.moveOrderer.order(state, 0, actions, ply, ttMove)[0]
+        successor = self.makeMove(state, 0, action)
+        value = self.expectimax(successor, depth, 1, L, min(self.upperBound, beta))
+        self.unmakeMove(state)
+        return max(L, value)
+
+
+class MCTSAgent(MultiAgentSearchAgent):
+    """
+    Monte Carlo tree search (UCT).  Each simulation walks down the tree of
+    Pacman decisions choosing actions by UCB1, samples every ghost's reply
+    from the ghost model's getDistribution, adds the first state it reaches
+    that is not in the tree yet, and plays out from it with cheap rollout
+    policies: Pacman heads for the nearest food, avoiding cells next to
+    dangerous ghosts, and the ghosts follow the model.  The value of the
+    playout's last state (its score if Pacman lost) is backed up along the
+    path, and the most visited root action is played.
+
+    Tree nodes are keyed by state hash, so the subtree under the state that
+    actually occurs is reused by the next move (-a reuse=0 turns this off).
+    Each move runs -a timeBudget seconds of simulations, or -a simulations
+    of them when there is no time budget.  depth is not used.
+    """
+
+    def __init__(self, simulations = '200', rolloutDepth = '20', exploration = '100',
+                 ghostModel = 'DirectionalGhost', treeSize = '200000', **kwargs):
+        MultiAgentSearchAgent.__init__(self, **kwargs)
+        import ghostAgents
+        # -a simulations=N：没有 timeBudget 时每步模拟 N 次
+        self.simulations = int(simulations)
+        # -a rolloutDepth=N：每次模拟最多走 N 步 Pacman 动作
+        self.rolloutDepth = int(rolloutDepth)
+        # -a exploration=C：UCB1 的探索系数，单位与评价函数相同
+        self.exploration = float(exploration)
+        # -a ghostModel=鬼的类型：树内和模拟时鬼的动作按它的 getDistribution 抽样
+        self.ghostType = getattr(ghostAgents, ghostModel)
+        self.ghostModels = {}
+        # reuse=0 时每步重新建树；-a treeSize=N：树超过 N 个节点时清空
+        self.treeSize = int(treeSize)
+        self.tree = {}
+
+    def getAction(self, gameState):
+        if not self.reuse or len(self.tree) > self.treeSize:
+            self.tree = {}
+        self.stats.startMove()
+        state = self.searchState(gameState)
+        if self.timeBudget > 0:
+            deadline = time.time() + self.timeBudget
+            count = 0
+            while count == 0 or time.time() < deadline:
+                self.simulate(state)
+                count += 1
+        else:
+            for i in range(self.simulations):
+                self.simulate(state)
+        # 没有固定的搜索深度，记为 0（分支因子也就不计算）
+        self.stats.endMove(0, gameState.getNumAgents())
+
+        node = self.tree.get(hash(gameState))
+        if node is None:
+            return random.choice(gameState.getLegalActions(0))
+        return max(node[1], key=lambda a: (node[1][a][0], node[1][a][1] / max(node[1][a][0], 1)))
+
+    def final(self, state):
+        MultiAgentSearchAgent.final(self, state)
+        self.tree = {}
+
+    def simulate(self, state):
+        """
+        Runs one simulation from state and backs up its value.  With
+        makeUnmake every move is taken back afterwards, leaving state as it
+        was.
+        """
+        self.stats.simulated()
+        tree = self.tree
+        root = state
+        path = []
+        moves = 0
+        while not (state.isWin() or state.isLose()):
+            key = hash(state)
+            node = tree.get(key)
+            if node is None:
+                actions = state.getLegalActions(0)
+                if len(actions) > 1 and Directions.STOP in actions:
+                    actions.remove(Directions.STOP)
+                tree[key] = [0, dict((action, [0, 0.0]) for action in actions)]
+                break
+            action = self.select(node)
+            path.append((node, action))
+            state, played = self.playRound(state, action)
+            moves += played
+
+        state, played = self.rollout(state)
+        moves += played
+        value = self.playoutValue(state)
+        for node, action in path:
+            node[0] += 1
+            edge = node[1][action]
+            edge[0] += 1
+            edge[1] += value
+        for i in range(moves):
+            self.unmakeMove(root)
+
+    def select(self, node):
+        """UCB1: an untried action if there is one, else the best bound."""
+        logVisits = math.log(node[0]) if node[0] > 0 else 0.0
+        bestAction = None
+        bestValue = float('-inf')
+        for action, (visits, total) in node[1].items():
+            if visits == 0:
+                return action
+            value = total / visits + self.exploration * math.sqrt(logVisits / visits)
+            if value > bestValue:
+                bestValue = value
+                bestAction = action
+        return bestAction
+
+    def playRound(self, state, action):
+        """
+        Plays Pacman's action and a sampled reply of each ghost.  Returns
+        the resulting state and the number of moves made.
+        """
+        state = self.makeMove(state, 0, action)
+        moves = 1
+        for agentIndex in range(1, state.getNumAgents()):
+            if state.isWin() or state.isLose():
+                break
+            state = self.makeMove(state, agentIndex, self.ghostAction(state, agentIndex))
+            moves += 1
+        return state, moves
+
+    def ghostAction(self, state, agentIndex):
+        ghost = self.ghostModels.get(agentIndex)
+        if ghost is None:
+            ghost = self.ghostModels[agentIndex] = self.ghostType(agentIndex)
+        return ghost.sampleAction(state)
+
+    def rollout(self, state):
+        """
+        Plays up to rolloutDepth rounds from state with the rollout policies.
+        Returns the last state and the number of moves made.
+        """
+        moves = 0
+        for i in range(self.rolloutDepth):
+            if state.isWin() or state.isLose():
+                break
+            state, played = self.playRound(state, self.rolloutAction(state))
+            moves += played
+        return state, moves
+
+    def rolloutAction(self, state):
+        """
+        Pacman's rollout policy: the move towards the nearest food (by maze
+        distance, ties broken at random) among those that do not end next to
+        a ghost that is not scared; any legal move if there are none.
+        """
+        actions = state.getLegalActions(0)
+        pos = state.getPacmanPosition()
+        mazeDistance = state.data.layout.getMazeDistance
+        dangers = [ghost.configuration.pos for ghost in state.data.agentStates[1:]
+                   if ghost.scaredTimer == 0]
+        bestActions = []
+        bestDistance = None
+        for action in actions:
+            if action == Directions.STOP:
+                continue
+            dx, dy = Actions.directionToVector(action)
+            nextPos = (int(pos[0] + dx), int(pos[1] + dy))
+            if any(mazeDistance(nextPos, ghostPos) <= 1 for ghostPos in dangers):
+                continue
+            nearest = state.getNearestFood(nextPos)
+            distance = nearest[0] if nearest is not None else 0
+            if bestDistance is None or distance < bestDistance:
+                bestActions, bestDistance = [action], distance
+            elif distance == bestDistance:
+                bestActions.append(action)
+        return random.choice(bestActions or actions)
+
+    def playoutValue(self, state):
+        if state.isLose():
+            return state.getScore()
+        return self.evaluate(state)
+
+
+_WORKER_AGENT = None
+_WORKER_BOUNDS = None
+_WORKER_SEARCH = None
+
+
+def _legalRank(gameState):
+    """
+    Maps each of Pacman's legal actions to its index in getLegalActions,
+    which breaks ties between root moves of equal value.
+    """
+    return dict((action, i) for i, action in enumerate(gameState.getLegalActions(0)))
+
+
+def _inWorkerProcess():
+    """
+    True inside a pool worker (e.g. a game played by pacman.py --workers),
+    where the cores are already in use and nested pools can deadlock.
+    """
+    import multiprocessing
+    return multiprocessing.parent_process() is not None
+
+
+def _initSearchWorker(agent, bounds):
+    global _WORKER_AGENT, _WORKER_BOUNDS
+    _WORKER_AGENT = agent
+    _WORKER_BOUNDS = bounds
+
+
+def _searchRootChild(gameState, index, action, depth, deadline, searchId, exactTies):
+    """
+    Searches root move number index in a worker process for
+    AlphaBetaAgent.searchRootParallel.  With exactTies alpha is lowered
+    just below the published bound, so that a value equal to it is exact.
+    Returns (value, search statistics counters, successors generated); the
+    value is None if the deadline passes.
+    """
+    global _WORKER_SEARCH
+    agent = _WORKER_AGENT
+    if searchId != _WORKER_SEARCH:
+        _WORKER_SEARCH = searchId
+        agent.startSearch()
+        if agent.moveOrderer is not None:
+            agent.moveOrderer.newMove()
+    agent.depth = depth
+    agent.deadline = deadline
+    alpha = float('-inf')
+    for i in range(index):
+        if _WORKER_BOUNDS[i] == _WORKER_BOUNDS[i]:  # NaN: not finished yet
+            alpha = max(alpha, _WORKER_BOUNDS[i])
+    if exactTies:
+        alpha = math.nextafter(alpha, float('-inf'))
+    agent.stats.startMove()
+    explored = gameState.exploredCount
+    try:
+        state = agent.searchState(gameState)
+        value = agent.alphabeta(agent.makeMove(state, 0, action), 0, 1, alpha, float('inf'))
+        _WORKER_BOUNDS[index] = value
+    except SearchTimeout:
+        value = None
+    return value, agent.stats.counters(), gameState.exploredCount - explored
 
 
 def betterEvaluationFunction(currentGameState):
@@ -354,36 +1527,38 @@ def betterEvaluationFunction(currentGameState):
     4. 计算安全路径长度，避免进入死路
     5. 鼓励顺畅移动，不横跳
     """
-    from util import manhattanDistance
     from game import Directions
     import util
-    import queue
 
     pacmanPos = currentGameState.getPacmanPosition()
-    foodList = currentGameState.getFood().asList()
+    numFood = currentGameState.getNumFood()
     ghosts = currentGameState.getGhostStates()
     capsules = currentGameState.getCapsules()
-    walls = currentGameState.getWalls()
 
     score = currentGameState.getScore()
 
+    # 迷宫距离（考虑墙），查表 O(1)
+    mazeDistance = currentGameState.data.layout.getMazeDistance
+
     # ---------- FEATURE 1: 食物距离 ----------
-    if foodList:
-        closestFoodDist = min(manhattanDistance(pacmanPos, f) for f in foodList)
+    # 按迷宫距离由近到远扫描，找到第一个食物即停
+    nearestFood = currentGameState.getNearestFood(pacmanPos)
+    if nearestFood is not None:
+        closestFoodDist = nearestFood[0]
         score += 10 / (closestFoodDist + 1)
 
     # ---------- FEATURE 2: 剩余食物惩罚 ----------
-    score -= 2 * len(foodList)
+    score -= 2 * numFood
 
     # ---------- FEATURE 3: 胶囊奖励 ----------
     if capsules:
-        closestCap = min(manhattanDistance(pacmanPos, c) for c in capsules)
+        closestCap = min(mazeDistance(pacmanPos, c) for c in capsules)
         score += 40 / (closestCap + 1)
         score -= 10 * len(capsules)
 
     # ---------- FEATURE 4: 鬼距离和状态 ----------
     for ghost in ghosts:
-        ghostDist = manhattanDistance(pacmanPos, ghost.getPosition())
+        ghostDist = mazeDistance(pacmanPos, ghost.getPosition())
         scaredTime = ghost.scaredTimer
         if scaredTime > 0:
             score += 50 / (ghostDist + 1)
@@ -401,35 +1576,16 @@ def betterEvaluationFunction(currentGameState):
     if leftDanger >= 2 and rightDanger >= 2:
         score -= 200  # 两边鬼扎堆，危险
 
-    # ---------- FEATURE 6: 安全路径长度（BFS） ----------
-    def bfs_safe_length(pos):
-        visited = set()
-        q = queue.Queue()
-        q.put((pos, 0))
-        visited.add(pos)
-        safe_count = 0
-        while not q.empty() and safe_count < 50:
-            current, dist = q.get()
-            x, y = current
-            if walls[x][y]:
-                continue
-            safe_count += 1
-            for dx, dy in [(-1,0),(1,0),(0,-1),(0,1)]:
-                nx, ny = x+dx, y+dy
-                if (nx,ny) not in visited and not walls[nx][ny]:
-                    if all(manhattanDistance((nx,ny), g.getPosition()) > 1 for g in ghosts):
-                        visited.add((nx,ny))
-                        q.put(((nx,ny), dist+1))
-        return safe_count
-
-    safeLen = bfs_safe_length(pacmanPos)
+    # ---------- FEATURE 6: 安全路径长度（洪泛填充） ----------
+    # 只关心是否小于 3，搜到 3 个格子即可停止；附近没有鬼时直接查地图拓扑
+    ghostPositions = [g.getPosition() for g in ghosts]
+    safeLen = currentGameState.data.layout.getSafeRegion().size(pacmanPos, ghostPositions, 3)
     if safeLen < 3:  # 死路或走廊
         score -= 300
 
     # ---------- FEATURE 7: 避免卡死 ----------
-    x, y = pacmanPos
-    nearbyWalls = walls[x+1][y] + walls[x-1][y] + walls[x][y+1] + walls[x][y-1]
-    if nearbyWalls >= 3:
+    # 三面是墙即死路尽头，查预先算好的地图拓扑
+    if currentGameState.data.layout.getTopology().isDeadEndTip(pacmanPos):
         score -= 200
 
     # ---------- FEATURE 8: 鼓励平稳移动 ----------
@@ -438,5 +1594,119 @@ def betterEvaluationFunction(currentGameState):
     return score
 
 
+def betterEvaluationBatch(states):
+    """
+    betterEvaluationFunction for a list of states of the same game (e.g. the
+    siblings at the last ply of a search), computed with NumPy over stacked
+    food bitmaps and position arrays.  Returns a float array whose entries
+    are exactly equal to betterEvaluationFunction of each state: every
+    feature is added in the same order with the same float operations.
+    """
+    layout = states[0].data.layout
+    tables = _evaluationTables(layout)
+    distances, cellBits, cellX, cellY, neighbors, wallCount = tables
+    cells, cellIds = layout.getCells()
+    numCells = len(cells)
+    rows = numpy.arange(len(states))
+
+    def cellOf(pos):
+        return cellIds[int(pos[0] + 0.5)][int(pos[1] + 0.5)]
+
+    score = numpy.array([s.getScore() for s in states], dtype=numpy.float64)
+    pacman = [s.getPacmanPosition() for s in states]
+    pacX = numpy.array([p[0] for p in pacman], dtype=numpy.float64)
+    pacY = numpy.array([p[1] for p in pacman], dtype=numpy.float64)
+    pacCell = numpy.array([cellOf(p) for p in pacman])
+    pacDistances = distances[pacCell]
+
+    # Feature 1, 2: food
+    numBytes = (layout.width * layout.height + 7) // 8
+    packed = numpy.frombuffer(b''.join(s.data.food.bits.to_bytes(numBytes, 'little') for s in states),
+                              dtype=numpy.uint8).reshape(len(states), numBytes)
+    food = numpy.unpackbits(packed, axis=1, bitorder='little')[:, cellBits].astype(bool)
+    numFood = food.sum(axis=1)
+    closestFood = numpy.where(food, pacDistances, 0xFFFF).min(axis=1)
+    score = numpy.where(numFood > 0, score + 10 / (closestFood + 1.0), score)
+    score = score - 2.0 * numFood
+
+    # Feature 3: capsules
+    capsules = numpy.zeros((len(states), numCells), dtype=bool)
+    for i, s in enumerate(states):
+        for c in s.getCapsules():
+            capsules[i, cellOf(c)] = True
+    numCapsules = capsules.sum(axis=1)
+    closestCapsule = numpy.where(capsules, pacDistances, 0xFFFF).min(axis=1)
+    score = numpy.where(numCapsules > 0, score + 40 / (closestCapsule + 1.0) - 10.0 * numCapsules, score)
+
+    # Feature 4: ghosts, one ghost index at a time as the scalar loop does
+    ghostStates = [s.getGhostStates() for s in states]
+    numGhosts = len(ghostStates[0])
+    ghostX = numpy.array([[g.getPosition()[0] for g in gs] for gs in ghostStates],
+                         dtype=numpy.float64).reshape(len(states), numGhosts)
+    ghostY = numpy.array([[g.getPosition()[1] for g in gs] for gs in ghostStates],
+                         dtype=numpy.float64).reshape(len(states), numGhosts)
+    for j in range(numGhosts):
+        ghostCell = numpy.array([cellOf(gs[j].getPosition()) for gs in ghostStates])
+        scared = numpy.array([gs[j].scaredTimer > 0 for gs in ghostStates])
+        ghostDist = pacDistances[rows, ghostCell] + 1.0
+        score = numpy.where(scared, score + 50 / ghostDist,
+                            numpy.where(ghostDist == 1, score - 999999, score - 50 / ghostDist))
+
+    # Feature 5: ghosts on both sides
+    sameRow = ghostY == pacY[:, None]
+    leftDanger = (sameRow & (ghostX == (pacX - 1)[:, None])).sum(axis=1)
+    rightDanger = (sameRow & (ghostX == (pacX + 1)[:, None])).sum(axis=1)
+    score = numpy.where((leftDanger >= 2) & (rightDanger >= 2), score - 200, score)
+
+    # Feature 6: fewer than 3 cells reachable without passing next to a ghost.
+    # The scalar BFS counts Pacman's cell, then its safe neighbours, then
+    # theirs, so the count is < 3 exactly when Pacman has no safe neighbour,
+    # or one whose only safe neighbour is Pacman's cell.
+    safe = numpy.ones((len(states), numCells + 1), dtype=bool)
+    safe[:, numCells] = False
+    for j in range(numGhosts):
+        safe[:, :numCells] &= (numpy.abs(cellX - ghostX[:, j:j + 1]) +
+                               numpy.abs(cellY - ghostY[:, j:j + 1])) > 1
+    adjacent = neighbors[pacCell]
+    adjacentSafe = safe[rows[:, None], adjacent]
+    numSafe = adjacentSafe.sum(axis=1)
+    onlySafe = adjacent[rows, adjacentSafe.argmax(axis=1)]
+    beyond = neighbors[numpy.minimum(onlySafe, numCells - 1)]
+    beyondSafe = (safe[rows[:, None], beyond] & (beyond != pacCell[:, None])).sum(axis=1)
+    deadEnd = (numSafe == 0) | ((numSafe == 1) & (beyondSafe == 0))
+    score = numpy.where(deadEnd, score - 300, score)
+
+    # Feature 7: walls on three sides
+    score = numpy.where(wallCount[pacCell] >= 3, score - 200, score)
+
+    # Feature 8
+    return score - 20
+
+
+def _evaluationTables(layout):
+    """
+    The per-layout NumPy arrays used by betterEvaluationBatch: the distance
+    matrix, each cell's food bit index and coordinates, a numCells x 4
+    neighbour matrix padded with the sentinel numCells, and each cell's
+    number of adjacent walls.
+    """
+    if 'evaluationTables' not in layout.derived:
+        cells, cellIds = layout.getCells()
+        numCells = len(cells)
+        distances = numpy.frombuffer(layout.getDistanceTable(), dtype=numpy.uint16).reshape(numCells, numCells)
+        cellBits = numpy.array([x * layout.height + y for x, y in cells])
+        cellX = numpy.array([x for x, y in cells], dtype=numpy.float64)
+        cellY = numpy.array([y for x, y in cells], dtype=numpy.float64)
+        neighbors = numpy.full((numCells, 4), numCells)
+        for i, adjacent in enumerate(layout.getNeighbors()):
+            neighbors[i, :len(adjacent)] = adjacent
+        topology = layout.getTopology()
+        wallCount = numpy.array([4 - topology.degree(pos) for pos in cells])
+        layout.derived['evaluationTables'] = (distances, cellBits, cellX, cellY, neighbors, wallCount)
+    return layout.derived['evaluationTables']
+
+
+betterEvaluationFunction.batch = betterEvaluationBatch
+
 # Abbreviation
 better = betterEvaluationFunction
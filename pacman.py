@@ -43,6 +43,8 @@ from game import GameStateData
 from game import Game
 from game import Directions
 from game import Actions
+from game import Configuration
+from game import BitGrid
 from util import nearestPoint
 from util import manhattanDistance
 import util
@@ -52,6 +54,7 @@ import types
 import time
 import random
 import os
+from collections import OrderedDict
 
 ###################################################
 # YOUR INTERFACE TO THE PACMAN WORLD: A GameState #
@@ -77,15 +80,85 @@ class GameState:
     # Accessor methods: use these to access state data #
     ####################################################
 
-    # static variable keeps track of which states have had getLegalActions called
+    # static variables tracking the successors generated (see setExploredMode)
     explored = set()
+    exploredMode = 'off'
+    exploredCap = 100000
+    exploredCount = 0
+
+    def setExploredMode(mode, cap=None):
+        """
+        Chooses what generateSuccessor records:
+          'off'   - nothing (the default; no states are hashed)
+          'count' - the number of successors generated, in exploredCount
+          'full'  - the count, plus the parent and child states in the
+                    explored set until it holds cap states
+        Clears what was recorded so far.
+        """
+        if mode not in EXPLORED_MODES:
+            raise Exception('Unknown exploration tracking mode: ' + str(mode))
+        GameState.exploredMode = mode
+        if cap != None:
+            GameState.exploredCap = cap
+        GameState.explored = set()
+        GameState.exploredCount = 0
+    setExploredMode = staticmethod(setExploredMode)
+
+    def recordExplored(parent, child):
+        GameState.exploredCount += 1
+        if GameState.exploredMode == 'full' and len(GameState.explored) < GameState.exploredCap:
+            if isinstance(parent, SearchState):
+                # apply/undo change it and its hash in place: keep a copy
+                parent = GameState(parent)
+            GameState.explored.add(parent)
+            GameState.explored.add(child)
+    recordExplored = staticmethod(recordExplored)
+
+    def addExploredCount(count):
+        """
+        Counts successors generated elsewhere, e.g. by the worker processes
+        of a parallel search.
+        """
+        if GameState.exploredMode != 'off':
+            GameState.exploredCount += count
+    addExploredCount = staticmethod(addExploredCount)
 
     def getAndResetExplored():
-        tmp = GameState.explored.copy()
+        tmp = GameState.explored
         GameState.explored = set()
+        GameState.exploredCount = 0
         return tmp
     getAndResetExplored = staticmethod(getAndResetExplored)
 
+    def getAndResetExploredCount():
+        tmp = GameState.exploredCount
+        GameState.explored = set()
+        GameState.exploredCount = 0
+        return tmp
+    getAndResetExploredCount = staticmethod(getAndResetExploredCount)
+
+    # static variable holding the successor memo (None: disabled)
+    successorCache = None
+
+    def enableSuccessorCache(size=4096):
+        """
+        Turns on the successor memo: until the next clearSuccessorCache,
+        generateSuccessor returns the already-built child for a (state,
+        agent, action) it has seen, instead of copying the state again.
+        The game rules clear it after every move.
+        """
+        GameState.successorCache = SuccessorCache(size)
+    enableSuccessorCache = staticmethod(enableSuccessorCache)
+
+    def disableSuccessorCache():
+        GameState.successorCache = None
+    disableSuccessorCache = staticmethod(disableSuccessorCache)
+
+    def clearSuccessorCache():
+        if GameState.successorCache is not None:
+            GameState.successorCache.clear()
+    clearSuccessorCache = staticmethod(clearSuccessorCache)
+
     def getLegalActions(self, agentIndex=0):
         """
         Returns the legal actions for the agent specified.
@@ -99,23 +172,47 @@ class GameState:
         else:
             return GhostRules.getLegalActions(self, agentIndex)
 
-    def generateSuccessor(self, agentIndex, action):
+    def generateSuccessor(self, agentIndex, action, validate=True):
         """
         Returns the successor state after the specified agent takes the action.
+
+        With validate=False the caller vouches that action is one of
+        getLegalActions(agentIndex), as search agents do for the actions they
+        just asked for: the legality check is skipped and a cheaper move is
+        applied.  The game itself always validates.
         """
         # Check that successors exist
         if self.isWin() or self.isLose():
             raise Exception('Can\'t generate a successor of a terminal state.')
 
+        cache = GameState.successorCache
+        if isinstance(self, SearchState):
+            # Keeps its id while apply/undo change it, so it cannot be a key
+            cache = None
+        if cache is not None:
+            state = cache.get(self, agentIndex, action)
+            if state is not None:
+                if GameState.exploredMode != 'off':
+                    GameState.recordExplored(self, state)
+                return state
+
         # Copy current state
         state = GameState(self)
 
         # Let agent's logic deal with its action's effects on the board
         if agentIndex == 0:  # Pacman is moving
-            state.data._eaten = [False for i in range(state.getNumAgents())]
-            PacmanRules.applyAction(state, action)
+            if validate:
+                state.data._eaten = [False for i in range(state.getNumAgents())]
+                PacmanRules.applyAction(state, action)
+            else:
+                # Shared and never written: GhostRules.collide copies it
+                state.data._eaten = _nothingEaten(state.getNumAgents())
+                PacmanRules.applyTrustedAction(state, action)
         else:                # A ghost is moving
-            GhostRules.applyAction(state, action, agentIndex)
+            if validate:
+                GhostRules.applyAction(state, action, agentIndex)
+            else:
+                GhostRules.applyTrustedAction(state, action, agentIndex)
 
         # Time passes
         if agentIndex == 0:
@@ -129,8 +226,11 @@ class GameState:
         # Book keeping
         state.data._agentMoved = agentIndex
         state.data.score += state.data.scoreChange
-        GameState.explored.add(self)
-        GameState.explored.add(state)
+        state.data.updateHash(self.data)
+        if GameState.exploredMode != 'off':
+            GameState.recordExplored(self, state)
+        if cache is not None:
+            cache.put(self, agentIndex, action, state)
         return state
 
     def getLegalPacmanActions(self):
@@ -183,7 +283,23 @@ class GameState:
         return self.data.capsules
 
     def getNumFood(self):
-        return self.data.food.count()
+        return self.data.numFood
+
+    def getFoodList(self):
+        """
+        Returns a list of the positions of the remaining food, like
+        getFood().asList() but cached on the state.
+        """
+        return list(self.data.getFoodList())
+
+    def getNearestFood(self, pos=None):
+        """
+        Returns (mazeDistance, position) of the food nearest to pos (by
+        default Pacman's position), or None if no food is left.
+        """
+        if pos == None:
+            pos = self.getPacmanPosition()
+        return self.data.getNearestFood(pos)
 
     def getFood(self):
         """
@@ -209,6 +325,13 @@ class GameState:
         """
         return self.data.layout.walls
 
+    def getMazeDistance(self, pos1, pos2):
+        """
+        Returns the true (wall-aware) distance between two positions, looked
+        up in the layout's precomputed distance table.
+        """
+        return self.data.layout.getMazeDistance(pos1, pos2)
+
     def hasFood(self, x, y):
         return self.data.food[x][y]
 
@@ -240,6 +363,13 @@ class GameState:
         state.data = self.data.deepCopy()
         return state
 
+    def makeSearchState(self):
+        """
+        Returns a SearchState copy of this state, for searches that apply
+        and undo moves in place.
+        """
+        return SearchState(self)
+
     def __eq__(self, other):
         """
         Allows two states to be compared.
@@ -262,6 +392,183 @@ class GameState:
         """
         self.data.initialize(layout, numGhostAgents)
 
+class SearchState(GameState):
+    """
+    A GameState that a search changes in place: apply(agentIndex, action)
+    makes a move and undo() takes back the most recent one, so a search can
+    walk the game tree without allocating a state per node (the "make /
+    unmake" scheme of chess engines).  All the GameState accessors work on
+    it, and its hash is kept up to date, so evaluation functions and
+    transposition tables can use it like any other state.
+
+    apply follows the same rules as generateSuccessor(..., validate=False)
+    and trusts that the action is legal.  The display bookkeeping fields
+    (_agentMoved, _foodEaten, _capsuleEaten, _eaten) are not maintained.
+    Each apply pushes one tuple on the undo stack: the moved agent and its
+    old configuration and scared timer, every agent's configuration and
+    timer when a capsule or a ghost collision changed the others, and the
+    food, capsules, score, win/lose flags and hash before the move.
+
+    The food grid and capsule list are replaced, never written, so states
+    made from a SearchState with generateSuccessor (which share them) do
+    not change when it does.
+    """
+
+    def __init__(self, state):
+        GameState.__init__(self)
+        self.data = state.data.deepCopy()
+        self.data._win = state.data._win
+        self.data._lose = state.data._lose
+        self.undoStack = []
+
+    def apply(self, agentIndex, action):
+        data = self.data
+        agentStates = data.agentStates
+        agent = agentStates[agentIndex]
+        oldConf, oldTimer = agent.configuration, agent.scaredTimer
+        oldFood, oldNumFood, oldFoodList, oldCapsules = data.food, data.numFood, data._foodList, data.capsules
+        oldScore, oldWin, oldLose, oldHash = data.score, data._win, data._lose, data._hash
+        saved = None
+        h = oldHash
+        scoreChange = 0
+
+        if agentIndex == 0:
+            pos = oldConf.pos
+            if action != Directions.STOP:
+                dx, dy = Actions._directions[action]
+                pos = (pos[0] + dx * PacmanRules.PACMAN_SPEED, pos[1] + dy * PacmanRules.PACMAN_SPEED)
+                agent.configuration = Configuration(pos, action)
+            # Eat
+            x, y = pos
+            bit = 1 << (x * data.layout.height + y)
+            if oldFood.bits & bit:
+                scoreChange += 10
+                data.food = BitGrid(oldFood.width, oldFood.height, bits=oldFood.bits ^ bit)
+                data.numFood -= 1
+                data._foodList = None
+                h ^= data._foodKey(x, y)
+                if data.numFood == 0 and not data._lose:
+                    scoreChange += 500
+                    data._win = True
+            if pos in oldCapsules:
+                data.capsules = [c for c in oldCapsules if c != pos]
+                h ^= data._capsuleKey(x, y)
+                saved = [(a.configuration, a.scaredTimer) for a in agentStates]
+                for index in range(1, len(agentStates)):
+                    agentStates[index].scaredTimer = SCARED_TIME
+            scoreChange -= TIME_PENALTY
+            killers = range(1, len(agentStates))
+        else:
+            speed = GhostRules.GHOST_SPEED
+            if oldTimer > 0:
+                speed /= 2.0
+            dx, dy = Actions._directions[action]
+            x, y = oldConf.pos
+            agent.configuration = Configuration((x + dx * speed, y + dy * speed), action)
+            # Time passes
+            if oldTimer == 1:
+                agent.configuration = Configuration(nearestPoint(agent.configuration.pos), action)
+            agent.scaredTimer = max(0, oldTimer - 1)
+            killers = [agentIndex]
+
+        # Collisions
+        pacmanPosition = agentStates[0].configuration.pos
+        for index in killers:
+            ghost = agentStates[index]
+            if GhostRules.canKill(pacmanPosition, ghost.configuration.pos):
+                if ghost.scaredTimer > 0:
+                    if saved is None and index != agentIndex:
+                        saved = [(a.configuration, a.scaredTimer) for a in agentStates]
+                    scoreChange += 200
+                    ghost.configuration = ghost.start
+                    ghost.scaredTimer = 0
+                elif not data._win:
+                    scoreChange -= 500
+                    data._lose = True
+
+        # Hash of the agents that changed
+        h ^= data._agentKey(agentIndex, oldConf, oldTimer) ^ data._agentHash(agentIndex, agent)
+        if saved is not None:
+            for index, (conf, timer) in enumerate(saved):
+                if index != agentIndex:
+                    h ^= data._agentKey(index, conf, timer) ^ data._agentHash(index, agentStates[index])
+        data._hash = h
+        data.score = oldScore + scoreChange
+
+        self.undoStack.append((agentIndex, oldConf, oldTimer, saved, oldFood, oldNumFood, oldFoodList,
+                               oldCapsules, oldScore, oldWin, oldLose, oldHash))
+        if GameState.exploredMode != 'off':
+            GameState.exploredCount += 1
+
+    def undo(self):
+        (agentIndex, conf, timer, saved, food, numFood, foodList,
+         capsules, score, win, lose, h) = self.undoStack.pop()
+        data = self.data
+        agentStates = data.agentStates
+        if saved is not None:
+            for agentState, (savedConf, savedTimer) in zip(agentStates, saved):
+                agentState.configuration = savedConf
+                agentState.scaredTimer = savedTimer
+        agent = agentStates[agentIndex]
+        agent.configuration = conf
+        agent.scaredTimer = timer
+        data.food = food
+        data.numFood = numFood
+        data._foodList = foodList
+        data.capsules = capsules
+        data.score = score
+        data._win = win
+        data._lose = lose
+        data._hash = h
+
+
+_NOTHING_EATEN = {}
+
+
+def _nothingEaten(numAgents):
+    """
+    A shared tuple of numAgents False values for GameStateData._eaten.
+    """
+    if numAgents not in _NOTHING_EATEN:
+        _NOTHING_EATEN[numAgents] = (False,) * numAgents
+    return _NOTHING_EATEN[numAgents]
+
+
+class SuccessorCache:
+    """
+    A bounded LRU memo of generated successors, keyed by (id(state), agent
+    index, action).  Each entry keeps a reference to its parent state, so
+    the id in its key cannot be reused by another state while it is cached.
+    """
+
+    def __init__(self, size=4096):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, state, agentIndex, action):
+        key = (id(state), agentIndex, action)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, state, agentIndex, action, successor):
+        self.entries[(id(state), agentIndex, action)] = (state, successor)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
 ############################################################################
 #                     THE HIDDEN SECRETS OF PACMAN                         #
 #                                                                          #
@@ -272,6 +579,7 @@ class GameState:
 SCARED_TIME = 40    # Moves ghosts are scared
 COLLISION_TOLERANCE = 0.7  # How close ghosts must be to Pacman to kill
 TIME_PENALTY = 1  # Number of points lost each round
+EXPLORED_MODES = ['off', 'count', 'full']  # See GameState.setExploredMode
 
 
 class ClassicGameRules:
@@ -297,6 +605,8 @@ class ClassicGameRules:
         """
         Checks to see whether it is time to end the game.
         """
+        # Successors memoized during this move are not needed again
+        GameState.clearSuccessorCache()
         if state.isWin():
             self.win(state, game)
         if state.isLose():
@@ -348,7 +658,11 @@ class PacmanRules:
         """
         Returns a list of possible actions.
         """
-        return Actions.getPossibleActions(state.getPacmanState().configuration, state.data.layout.walls)
+        conf = state.data.agentStates[0].configuration
+        entry = state.data.layout.getLegalActionTable().get(conf.pos)
+        if entry is None:
+            return Actions.getPossibleActions(conf, state.data.layout.walls)
+        return list(entry[0])
     getLegalActions = staticmethod(getLegalActions)
 
     def applyAction(state, action):
@@ -374,22 +688,36 @@ class PacmanRules:
             PacmanRules.consume(nearest, state)
     applyAction = staticmethod(applyAction)
 
+    def applyTrustedAction(state, action):
+        """
+        applyAction for an action known to be legal.  Pacman moves a whole
+        cell at a time, so he always lands on a grid point and the new
+        heading is simply the action.
+        """
+        pacmanState = state.data.agentStates[0]
+        next = pacmanState.configuration.pos
+        if action != Directions.STOP:  # There is no stop direction
+            dx, dy = Actions._directions[action]
+            x, y = next
+            next = (x + dx * PacmanRules.PACMAN_SPEED, y + dy * PacmanRules.PACMAN_SPEED)
+            pacmanState.configuration = Configuration(next, action)
+        PacmanRules.consume(next, state)
+    applyTrustedAction = staticmethod(applyTrustedAction)
+
     def consume(position, state):
         x, y = position
         # Eat food
         if state.data.food[x][y]:
             state.data.scoreChange += 10
-            state.data.food = state.data.food.copy()
-            state.data.food[x][y] = False
+            state.data.eatFood(x, y)
             state.data._foodEaten = position
-            # TODO: cache numFood?
             numFood = state.getNumFood()
             if numFood == 0 and not state.data._lose:
                 state.data.scoreChange += 500
                 state.data._win = True
         # Eat capsule
         if(position in state.getCapsules()):
-            state.data.capsules.remove(position)
+            state.data.capsules = [c for c in state.data.capsules if c != position]
             state.data._capsuleEaten = position
             # Reset all ghosts' scared timers
             for index in range(1, len(state.data.agentStates)):
@@ -408,7 +736,12 @@ class GhostRules:
         Ghosts cannot stop, and cannot turn around unless they
         reach a dead end, but can turn 90 degrees at intersections.
         """
-        conf = state.getGhostState(ghostIndex).configuration
+        conf = state.data.agentStates[ghostIndex].configuration
+        entry = state.data.layout.getLegalActionTable().get(conf.pos)
+        if entry is not None:
+            # Whole cell: precomputed per heading (see Layout.getActionMasks)
+            return list(entry[1][conf.direction])
+        # Scared ghosts move at half speed and can be between cells
         possibleActions = Actions.getPossibleActions(
             conf, state.data.layout.walls)
         reverse = Actions.reverseDirection(conf.direction)
@@ -434,6 +767,20 @@ class GhostRules:
             vector)
     applyAction = staticmethod(applyAction)
 
+    def applyTrustedAction(state, action, ghostIndex):
+        """
+        applyAction for an action known to be legal.  Ghosts never stop, so
+        the new heading is simply the action.
+        """
+        ghostState = state.data.agentStates[ghostIndex]
+        speed = GhostRules.GHOST_SPEED
+        if ghostState.scaredTimer > 0:
+            speed /= 2.0
+        dx, dy = Actions._directions[action]
+        x, y = ghostState.configuration.pos
+        ghostState.configuration = Configuration((x + dx * speed, y + dy * speed), action)
+    applyTrustedAction = staticmethod(applyTrustedAction)
+
     def decrementTimer(ghostState):
         timer = ghostState.scaredTimer
         if timer == 1:
@@ -462,8 +809,11 @@ class GhostRules:
             state.data.scoreChange += 200
             GhostRules.placeGhost(state, ghostState)
             ghostState.scaredTimer = 0
-            # Added for first-person
-            state.data._eaten[agentIndex] = True
+            # Added for first-person.  The list may be shared with other
+            # states, so it is copied before writing.
+            eaten = list(state.data._eaten)
+            eaten[agentIndex] = True
+            state.data._eaten = eaten
         else:
             if not state.data._win:
                 state.data.scoreChange -= 500
@@ -554,6 +904,14 @@ def readCommand(argv):
                       help='Turns on exception handling and timeouts during games', default=False)
     parser.add_option('--timeout', dest='timeout', type='int',
                       help=default('Maximum length of time an agent can spend computing in a single game'), default=30)
+    parser.add_option('--statsFile', dest='statsFile',
+                      help='Write the per-move search statistics of agents that collect them (e.g. -a stats=1) to this JSON file', default=None)
+    parser.add_option('--workers', dest='workers', type='int',
+                      help=default('Number of processes to play games in parallel (games run without graphics)'), default=1)
+    parser.add_option('--explored', dest='explored', type='choice', choices=EXPLORED_MODES,
+                      help=default('Track the states generated: off, count, or full (keeps the states)'), default='off')
+    parser.add_option('--exploredCap', dest='exploredCap', type='int',
+                      help=default('Maximum number of states kept with --explored full'), default=100000)
 
     options, otherjunk = parser.parse_args(argv)
     if len(otherjunk) != 0:
@@ -564,6 +922,8 @@ def readCommand(argv):
     if options.fixRandomSeed:
         random.seed('cs188')
 
+    GameState.setExploredMode(options.explored, options.exploredCap)
+
     # Choose a layout
     args['layout'] = layout.getLayout(options.layout)
     if args['layout'] == None:
@@ -606,6 +966,8 @@ def readCommand(argv):
     args['record'] = options.record
     args['catchExceptions'] = options.catchExceptions
     args['timeout'] = options.timeout
+    args['workers'] = options.workers
+    args['statsFile'] = options.statsFile
 
     # Special case: recorded games don't use the runGames method or args structure
     if options.gameToReplay != None:
@@ -672,40 +1034,140 @@ def replayGame(layout, actions, display):
     display.finish()
 
 
-def runGames(layout, pacman, ghosts, display, numGames, record, numTraining=0, catchExceptions=False, timeout=30):
+def recordGame(index, layout, moveHistory):
+    import time
+    import pickle
+    fname = ('recorded-game-%d' % (index + 1)) + \
+        '-'.join([str(t) for t in time.localtime()[1:6]])
+    f = open(fname, 'wb')
+    components = {'layout': layout, 'actions': moveHistory}
+    pickle.dump(components, f)
+    f.close()
+
+
+class GameRecord:
+    """
+    The picklable outcome of a game played in a worker process: the final
+    state and the move history, plus the Game flags that the runner reads.
+    """
+
+    def __init__(self, game):
+        self.state = game.state
+        self.moveHistory = game.moveHistory
+        self.agentCrashed = game.agentCrashed
+        self.agentTimeout = game.agentTimeout
+        self.totalAgentTimes = game.totalAgentTimes
+        self.gameOver = game.gameOver
+        self.searchStats = game.searchStats
+
+
+_WORKER_SETUP = None
+
+
+def _initGameWorker(layout, pacman, ghosts, catchExceptions, timeout):
+    global _WORKER_SETUP
+    _WORKER_SETUP = (layout, pacman, ghosts, catchExceptions, timeout)
+
+
+def _playGameInWorker(seed):
+    """
+    Plays one headless game in a worker process.  Each game reseeds the
+    worker's RNG with its own seed, so results do not depend on which worker
+    runs which game.
+    """
+    import textDisplay
+    layout, pacman, ghosts, catchExceptions, timeout = _WORKER_SETUP
+    random.seed(seed)
+    rules = ClassicGameRules(timeout)
+    game = rules.newGame(layout, pacman, ghosts,
+                         textDisplay.NullGraphics(), True, catchExceptions)
+    game.run()
+    return GameRecord(game)
+
+
+def gameSeeds(numGames):
+    """
+    Draws one seed per game from the RNG.  Game i of runGames is always
+    played from the i-th seed, with or without worker processes, so a run
+    with a fixed seed plays the same games for any number of workers.
+    """
+    return [random.randrange(2 ** 32) for i in range(numGames)]
+
+
+def runGamesInParallel(layout, pacman, ghosts, seeds, workers, catchExceptions=False, timeout=30):
+    """
+    Plays one game per seed (see gameSeeds) on a pool of worker processes
+    and returns their GameRecords in game order.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers, initializer=_initGameWorker,
+                             initargs=(layout, pacman, ghosts, catchExceptions, timeout)) as pool:
+        return list(pool.map(_playGameInWorker, seeds))
+
+
+def reportSearchStats(games, statsFile=None):
+    """
+    Prints the aggregated search statistics that agents left in each game's
+    searchStats, and optionally writes the per-game, per-move records to
+    statsFile as JSON.
+    """
+    import multiAgents
+    numAgents = max([len(game.searchStats) for game in games])
+    for agentIndex in range(numAgents):
+        summaries = [game.searchStats[agentIndex] for game in games
+                     if agentIndex < len(game.searchStats) and game.searchStats[agentIndex] != None]
+        if summaries:
+            print('Agent %d' % agentIndex)
+            print(multiAgents.formatSearchStats(summaries))
+    if statsFile != None:
+        import json
+        f = open(statsFile, 'w')
+        json.dump([{'game': i, 'searchStats': game.searchStats}
+                   for i, game in enumerate(games)], f, indent=1)
+        f.close()
+
+
+def runGames(layout, pacman, ghosts, display, numGames, record, numTraining=0, catchExceptions=False, timeout=30, workers=1, statsFile=None):
     import __main__
     __main__.__dict__['_display'] = display
 
     rules = ClassicGameRules(timeout)
     games = []
-
-    for i in range(numGames):
-        beQuiet = i < numTraining
-        if beQuiet:
-                # Suppress output and graphics
-            import textDisplay
-            gameDisplay = textDisplay.NullGraphics()
-            rules.quiet = True
-        else:
-            gameDisplay = display
-            rules.quiet = False
-        game = rules.newGame(layout, pacman, ghosts,
-                             gameDisplay, beQuiet, catchExceptions)
-        game.run()
-        if not beQuiet:
-            games.append(game)
-
-        if record:
-            import time
-            import pickle
-            fname = ('recorded-game-%d' % (i + 1)) + \
-                '-'.join([str(t) for t in time.localtime()[1:6]])
-            f = file(fname, 'w')
-            components = {'layout': layout, 'actions': game.moveHistory}
-            pickle.dump(components, f)
-            f.close()
-
-    if (numGames-numTraining) > 0:
+    seeds = gameSeeds(numGames)
+
+    if workers > 1:
+        records = runGamesInParallel(layout, pacman, ghosts, seeds, workers,
+                                     catchExceptions, timeout)
+        for i, game in enumerate(records):
+            beQuiet = i < numTraining
+            rules.quiet = beQuiet
+            rules.process(game.state, game)
+            if not beQuiet:
+                games.append(game)
+            if record:
+                recordGame(i, layout, game.moveHistory)
+    else:
+        for i in range(numGames):
+            beQuiet = i < numTraining
+            if beQuiet:
+                    # Suppress output and graphics
+                import textDisplay
+                gameDisplay = textDisplay.NullGraphics()
+                rules.quiet = True
+            else:
+                gameDisplay = display
+                rules.quiet = False
+            random.seed(seeds[i])
+            game = rules.newGame(layout, pacman, ghosts,
+                                 gameDisplay, beQuiet, catchExceptions)
+            game.run()
+            if not beQuiet:
+                games.append(game)
+
+            if record:
+                recordGame(i, layout, game.moveHistory)
+
+    if len(games) > 0:
         scores = [game.state.getScore() for game in games]
         wins = [game.state.isWin() for game in games]
         winRate = wins.count(True) / float(len(wins))
@@ -715,6 +1177,12 @@ def runGames(layout, pacman, ghosts, display, numGames, record, numTraining=0, c
               (wins.count(True), len(wins), winRate))
         print('Record:       ', ', '.join(
             [['Loss', 'Win'][int(w)] for w in wins]))
+        if any([stats != None for game in games for stats in game.searchStats]):
+            reportSearchStats(games, statsFile)
+        if GameState.exploredMode != 'off' and workers <= 1:
+            print('Explored:      %d successors generated' % GameState.exploredCount)
+            if GameState.exploredMode == 'full':
+                print('               %d distinct states kept' % len(GameState.explored))
 
     return games
 
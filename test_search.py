@@ -0,0 +1,138 @@
+# test_search.py
+# --------------
+"""
+Deterministic checks of the equivalences the search code relies on:
+
+  - the incremental Zobrist hash equals the hash computed from scratch;
+  - SearchState.apply gives the same state as generateSuccessor, and
+    undo restores the state it was applied to;
+  - betterEvaluationBatch equals betterEvaluationFunction bit for bit;
+  - AlphaBetaAgent's parallel root search picks the move and value of the
+    serial one.
+
+Each check replays seeded random games.  Run with 'python -m unittest
+test_search' (or pytest) from this directory.
+"""
+import random
+import unittest
+
+import layout
+import multiAgents
+from pacman import GameState
+
+LAYOUTS = ['smallClassic', 'mediumClassic', 'trickyClassic']
+
+
+def randomGame(layoutName, seed, maxPlies=400):
+    """
+    The states of a random game on layoutName, played from seed, with
+    every move as (state, agentIndex, action).
+    """
+    rng = random.Random(seed)
+    state = GameState()
+    state.initialize(layout.getLayout(layoutName), 4)
+    moves = []
+    while not (state.isWin() or state.isLose()) and len(moves) < maxPlies:
+        for agentIndex in range(state.getNumAgents()):
+            if state.isWin() or state.isLose():
+                break
+            action = rng.choice(state.getLegalActions(agentIndex))
+            moves.append((state, agentIndex, action))
+            state = state.generateSuccessor(agentIndex, action)
+    return moves
+
+
+class ZobristHashTest(unittest.TestCase):
+
+    def test_incremental_hash_matches_recompute(self):
+        for layoutName in LAYOUTS:
+            for seed in range(5):
+                for state, agentIndex, action in randomGame(layoutName, seed):
+                    for validate in (True, False):
+                        child = state.generateSuccessor(agentIndex, action, validate)
+                        self.assertEqual(child.data._hash, child.data.computeHash())
+
+
+class SearchStateTest(unittest.TestCase):
+
+    def assertSameState(self, state, expected):
+        self.assertEqual(state.data, expected.data)
+        self.assertEqual(hash(state), hash(expected))
+        self.assertEqual(state.data._hash, expected.data.computeHash())
+        self.assertEqual(state.getScore(), expected.getScore())
+        self.assertEqual(state.isWin(), expected.isWin())
+        self.assertEqual(state.isLose(), expected.isLose())
+        self.assertEqual(state.getNumFood(), expected.getNumFood())
+
+    def test_apply_matches_generate_successor(self):
+        for layoutName in LAYOUTS:
+            for seed in range(5):
+                for state, agentIndex, action in randomGame(layoutName, seed):
+                    searchState = state.makeSearchState()
+                    searchState.apply(agentIndex, action)
+                    self.assertSameState(searchState, state.generateSuccessor(agentIndex, action, False))
+
+    def test_undo_restores_state(self):
+        for layoutName in LAYOUTS:
+            for seed in range(5):
+                moves = randomGame(layoutName, seed)
+                searchState = moves[0][0].makeSearchState()
+                for state, agentIndex, action in moves:
+                    searchState.apply(agentIndex, action)
+                # Take the whole game back, checking each state on the way
+                for state, agentIndex, action in reversed(moves):
+                    searchState.undo()
+                    self.assertSameState(searchState, state)
+
+    def test_apply_leaves_successors_alone(self):
+        for state, agentIndex, action in randomGame('mediumClassic', 0):
+            if state.isWin() or state.isLose():
+                continue
+            searchState = state.makeSearchState()
+            child = searchState.generateSuccessor(agentIndex, action)
+            before = (child.data.food.bits, list(child.data.capsules), child.data.computeHash())
+            for nextAction in searchState.getLegalActions(0):
+                searchState.apply(0, nextAction)
+                searchState.undo()
+            self.assertEqual((child.data.food.bits, list(child.data.capsules), child.data.computeHash()),
+                             before)
+
+
+@unittest.skipUnless(multiAgents._NUMPY_ENABLED, 'NumPy is not installed')
+class BatchEvaluationTest(unittest.TestCase):
+
+    def test_batch_equals_scalar(self):
+        for layoutName in LAYOUTS:
+            for seed in range(5):
+                states = [state for state, agentIndex, action in randomGame(layoutName, seed)]
+                for size in (2, 3, 4, 16):
+                    for i in range(0, len(states) - size + 1, size):
+                        group = states[i:i + size]
+                        batch = multiAgents.betterEvaluationBatch(group).tolist()
+                        self.assertEqual(batch, [multiAgents.betterEvaluationFunction(s) for s in group])
+
+
+class ParallelRootTest(unittest.TestCase):
+
+    def test_parallel_root_matches_serial(self):
+        serial = multiAgents.AlphaBetaAgent(evalFn='better', depth='2')
+        parallel = multiAgents.AlphaBetaAgent(evalFn='better', depth='2', parallel='2')
+        try:
+            for layoutName in ['smallClassic', 'mediumClassic']:
+                states = [state for state, agentIndex, action in randomGame(layoutName, 1)
+                          if agentIndex == 0]
+                for state in states[::5]:
+                    results = []
+                    for agent in (serial, parallel):
+                        agent.startSearch()
+                        agent.searchId += 1
+                        bestAction, values = agent.searchRoot(state, state.getLegalActions(0))
+                        results.append((bestAction, values[bestAction]))
+                    self.assertEqual(results[0], results[1])
+        finally:
+            if parallel.pool is not None:
+                parallel.pool.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()